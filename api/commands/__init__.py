@@ -0,0 +1,11 @@
+from api.commands.storage_commands import storage_cli
+from api.commands.model_commands import models_cli
+from api.commands.stats_commands import stats_cli
+from api.commands.incident_commands import incidents_cli
+
+
+def register_commands(app): # flask <group> <command> CLI commands
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(models_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(incidents_cli)
@@ -0,0 +1,15 @@
+import click
+from flask.cli import AppGroup
+from database import db
+from api.service.incident_service import rebuild_incidents
+
+incidents_cli = AppGroup('incidents', help='Manage the grouping of duplicate reports into incidents.')
+
+
+@incidents_cli.command('rebuild')
+@click.option('--batch-size', default=5000, show_default=True, help='Detections read and relinked per round trip.')
+def rebuild(batch_size):
+    """Regroup every detection into incidents (backfill, or after changing INCIDENT_RADIUS_M / _WINDOW_DAYS)."""
+    count = rebuild_incidents(batch_size)
+    db.session.commit()
+    click.echo(f"Rebuilt incidents: {count} incidents.")
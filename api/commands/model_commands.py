@@ -0,0 +1,167 @@
+import json
+import os
+import statistics
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from api.service.model_backends import BACKENDS, artifact_path, export
+from api.service.detection_service import MODEL_WEIGHTS, decode_image, inference_imgsz, model_predict
+
+models_cli = AppGroup('models', help='Export, compare and benchmark the detection models.')
+
+_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+def _sample_images(folder, limit):
+    # decoded (BGR, INFERENCE_IMGSZ) arrays of up to limit images under folder,
+    # by default the stored originals of both detection types
+    folders = [folder] if folder else [current_app.config['POTHOLE_ORIGINAL_FOLDER'],
+                                       current_app.config['WASTE_ORIGINAL_FOLDER']]
+    images = []
+    for base in folders:
+        for root, _, files in sorted(os.walk(base)):
+            for filename in sorted(files):
+                if not filename.lower().endswith(_IMAGE_EXTENSIONS):
+                    continue
+                with open(os.path.join(root, filename), 'rb') as f:
+                    array = decode_image(f.read())
+                if array is not None:
+                    images.append(array)
+                if len(images) >= limit:
+                    return images
+    return images
+
+
+def _load(name, backend, int8):
+    from ultralytics import YOLO
+    path = artifact_path(MODEL_WEIGHTS[name], backend, int8)
+    if not os.path.exists(path):
+        raise click.ClickException(f"{path} does not exist, run `flask models export --backend {backend}` first")
+    return YOLO(path, task='detect')
+
+
+def _predict(model, image):
+    return model_predict(model, [image], inference_imgsz())[0]
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _boxes(result):
+    return [(int(cls), box) for cls, box in zip(result.boxes.cls.tolist(), result.boxes.xyxyn.tolist())]
+
+
+def _agrees(reference, candidate, min_iou):
+    # same classes found, and every reference box has a candidate box of its class overlapping it
+    ref_boxes, cand_boxes = _boxes(reference), _boxes(candidate)
+    if {cls for cls, _ in ref_boxes} != {cls for cls, _ in cand_boxes}:
+        return False
+    for cls, box in ref_boxes:
+        best = max((_iou(box, other) for other_cls, other in cand_boxes if other_cls == cls), default=0.0)
+        if best < min_iou:
+            return False
+    return True
+
+
+def _model_names(name):
+    return list(MODEL_WEIGHTS) if name == 'all' else [name]
+
+
+_model_option = click.option('--model', 'name', type=click.Choice(['all', *MODEL_WEIGHTS]), default='all', show_default=True)
+
+
+@models_cli.command('export')
+@_model_option
+@click.option('--backend', type=click.Choice(BACKENDS[1:]), required=True)
+@click.option('--int8', is_flag=True, help='Also quantize to INT8.')
+@click.option('--data', default=None, help='Calibration dataset yaml for OpenVINO INT8.')
+def export_models(name, backend, int8, data):
+    """Export the .pt weights to ONNX or OpenVINO."""
+    imgsz = current_app.config.get('INFERENCE_IMGSZ', 640) or 640
+    for model_name in _model_names(name):
+        path = export(MODEL_WEIGHTS[model_name], backend, int8=int8, imgsz=imgsz, data=data)
+        click.echo(f"{model_name}: exported to {path}")
+
+
+@models_cli.command('parity')
+@_model_option
+@click.option('--backend', type=click.Choice(BACKENDS[1:]), required=True)
+@click.option('--int8', is_flag=True, help='Compare the INT8 artifacts.')
+@click.option('--images', 'folder', default=None, help='Folder with sample images (default: stored originals).')
+@click.option('--limit', default=50, show_default=True)
+@click.option('--min-iou', default=0.5, show_default=True)
+@click.option('--min-agreement', default=0.95, show_default=True, help='Fail below this share of agreeing images.')
+def parity(name, backend, int8, folder, limit, min_iou, min_agreement):
+    """Check that an exported backend detects the same things as the .pt weights."""
+    images = _sample_images(folder, limit)
+    if not images:
+        raise click.ClickException("No sample images found")
+
+    failed = False
+    for model_name in _model_names(name):
+        reference = _load(model_name, 'pytorch', False)
+        candidate = _load(model_name, backend, int8)
+        agreeing = sum(_agrees(_predict(reference, image), _predict(candidate, image), min_iou) for image in images)
+        agreement = agreeing / len(images)
+        failed = failed or agreement < min_agreement
+        click.echo(f"{model_name}: {backend}{' int8' if int8 else ''} agrees with pytorch on "
+                   f"{agreeing}/{len(images)} images ({agreement:.1%})")
+    if failed:
+        raise click.ClickException(f"Agreement below {min_agreement:.0%}")
+
+
+@models_cli.command('bench')
+@_model_option
+@click.option('--backends', default=','.join(BACKENDS), show_default=True, help='Comma separated backends.')
+@click.option('--int8', is_flag=True, help='Benchmark the INT8 artifacts of the exported backends.')
+@click.option('--images', 'folder', default=None, help='Folder with sample images (default: stored originals).')
+@click.option('--limit', default=20, show_default=True)
+@click.option('--runs', default=3, show_default=True, help='Passes over the images.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the results as JSON.')
+def bench(name, backends, int8, folder, limit, runs, as_json):
+    """Per-image inference latency of each backend on this machine."""
+    images = _sample_images(folder, limit)
+    if not images:
+        raise click.ClickException("No sample images found")
+
+    results = []
+    for model_name in _model_names(name):
+        for backend in [b.strip() for b in backends.split(',') if b.strip()]:
+            if backend not in BACKENDS:
+                raise click.ClickException(f"Unknown backend {backend}")
+            quantized = int8 and backend != 'pytorch'
+            try:
+                model = _load(model_name, backend, quantized)
+            except click.ClickException as e:
+                click.echo(f"{model_name}/{backend}: skipped, {e.message}", err=True)
+                continue
+            _predict(model, images[0])  # warm-up, not measured
+            timings = []
+            for _ in range(runs):
+                for image in images:
+                    started = time.perf_counter()
+                    _predict(model, image)
+                    timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results.append({
+                "model": model_name,
+                "backend": backend,
+                "int8": quantized,
+                "images": len(timings),
+                "mean_ms": round(statistics.mean(timings), 2),
+                "p50_ms": round(timings[len(timings) // 2], 2),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            })
+
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+    for row in results:
+        click.echo(f"{row['model']:8} {row['backend']:9}{' int8' if row['int8'] else '     '} "
+                   f"mean {row['mean_ms']:8.2f} ms  p50 {row['p50_ms']:8.2f} ms  p95 {row['p95_ms']:8.2f} ms")
@@ -0,0 +1,16 @@
+import click
+from flask.cli import AppGroup
+from database import db
+from api.service import stats_service, tile_service
+
+stats_cli = AppGroup('stats', help='Manage the dashboard counts and map tile cells.')
+
+
+@stats_cli.command('rebuild')
+@click.option('--batch-size', default=5000, show_default=True, help='Detections read per round trip.')
+def rebuild(batch_size):
+    """Recompute detection_stats and detection_tile_cells from the detections table (backfill)."""
+    stats_rows = stats_service.rebuild(batch_size)
+    tile_rows = tile_service.rebuild(batch_size)
+    db.session.commit()
+    click.echo(f"Rebuilt detection_stats: {stats_rows} rows, detection_tile_cells: {tile_rows} rows.")
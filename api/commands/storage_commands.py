@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from database import db
+from api.models.detection_model import Detection
+from api.service import storage
+
+storage_cli = AppGroup('storage', help='Manage stored image files.')
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _existing(paths):
+    return next((path for path in paths if path and os.path.isfile(path)), None)
+
+
+def _original_source(record, prefix):
+    # Flat-layout originals are <TYPE>_ORIGINAL_FOLDER/<image_name>. The path columns of old rows
+    # don't point at the files (e.g. "uploads/<type>/<client filename>"), they are only a fallback.
+    return _existing([
+        os.path.join(current_app.config[f'{prefix}_ORIGINAL_FOLDER'], record.image_name),
+        storage.absolute_path(record.image_path) if record.image_path else None,
+    ])
+
+
+def _detected_source(record, prefix):
+    # "<ts>_<name>" was annotated as "<ts>_detected_<name>" (batch uploads: "<ts>_<index>_detected_<name>"),
+    # so every "_" of image_name is tried as the split point
+    folder = current_app.config[f'{prefix}_DETECTED_FOLDER']
+    name = record.image_name
+    candidates = [os.path.join(folder, f"{name[:i]}_detected_{name[i + 1:]}") for i, char in enumerate(name) if char == '_']
+    if record.detected_image_path:
+        candidates.append(storage.absolute_path(record.detected_image_path))
+    return _existing(candidates)
+
+
+def _link_or_copy(source, target):
+    # the old file stays in place until the new paths are committed
+    if os.path.exists(target):
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+@storage_cli.command('shard')
+@click.option('--batch-size', default=500, show_default=True, help='Detections updated per commit.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be moved.')
+def shard(batch_size, dry_run):
+    """Move flat-layout images into the sharded layout and rewrite detection paths."""
+    moved = {}  # old absolute path -> new name, files can be shared by several detections
+    counts = {"moved": 0, "missing": 0}
+    last_id = 0
+
+    while True:
+        records = Detection.query.filter(
+            Detection.id > last_id,
+            ~Detection.image_name.contains('/')
+        ).order_by(Detection.id).limit(batch_size).all()
+        if not records:
+            break
+        last_id = records[-1].id
+        to_remove = []
+
+        for record in records:
+            prefix = record.detection_type.upper()
+            original_source = _original_source(record, prefix)
+            if original_source is None:
+                counts["missing"] += 1
+                continue
+            if original_source in moved:
+                new_name = moved[original_source]
+            else:
+                extension = os.path.splitext(record.image_name)[1].lower() or '.jpg'
+                new_name = storage.sharded_name(_file_hash(original_source), extension)
+                if not dry_run:
+                    _link_or_copy(original_source, storage.folder_path(current_app.config[f'{prefix}_ORIGINAL_FOLDER'], new_name))
+                moved[original_source] = new_name
+                to_remove.append(original_source)
+
+            # the detected image is named after the original's hash
+            detected_name = os.path.splitext(new_name)[0] + '.jpg'
+            detected_source = _detected_source(record, prefix)
+            if detected_source is not None:
+                if not dry_run:
+                    _link_or_copy(detected_source, storage.folder_path(current_app.config[f'{prefix}_DETECTED_FOLDER'], detected_name))
+                to_remove.append(detected_source)
+                record.detected_image_path = f"storage/{record.detection_type}/detected/{detected_name}"
+
+            record.image_name = new_name
+            record.image_path = f"storage/{record.detection_type}/original/{new_name}"
+            counts["moved"] += 1
+
+        if dry_run:
+            db.session.rollback()
+            continue
+
+        db.session.commit()
+        for path in set(to_remove):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        click.echo(f"... {counts['moved']} detections moved")
+
+    prefix = "Would move" if dry_run else "Moved"
+    click.echo(f"{prefix} {counts['moved']} detections to the sharded layout, {counts['missing']} had no file on disk.")
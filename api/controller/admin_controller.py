@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify, request, send_file
+from api.controller.auth.auth_middleware import role_required
+from api.service.profiler import profiler
+
+admin_bp = Blueprint('admin_bp', __name__, url_prefix='/admin')
+
+
+# GET — Stored request profiles, newest first (PROFILING_ENABLED)
+@admin_bp.route('/profiles', methods=['GET'])
+@role_required('admin')
+def list_profiles(current_user):
+    return jsonify(profiler.list_reports()), 200
+
+
+# GET — Download one profile: pstats file (default, open with snakeviz / pstats) or ?format=txt summary
+@admin_bp.route('/profiles/<string:profile_id>', methods=['GET'])
+@role_required('admin')
+def download_profile(current_user, profile_id):
+    as_text = request.args.get('format') == 'txt'
+    path = profiler.report_path(profile_id, '.txt' if as_text else '.prof')
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if as_text:
+        return send_file(path, mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.prof")
@@ -1,7 +1,7 @@
 import jwt
 from functools import wraps
 from flask import request, jsonify, current_app
-from api.models.user_model import User  
+from api.service.user_cache import user_cache
 
 
 #middleware function to protect routes
@@ -23,9 +23,10 @@ def token_required(f): #check JWT tokens for protected routes and feteches the
             # Decoding token= token valid xaki xaina vanera check garne
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
 
-            # Fetching the user from DB so the logged-in user is known without manually sending ID in URL
+            # Fetching the user so the logged-in user is known without manually sending ID in URL
+            # (from the user cache when possible, so most requests skip this DB query)
             user_id = data.get("id")
-            current_user = User.query.get(user_id)
+            current_user = user_cache.get_user(user_id)
 
             if not current_user: #matching user xaina vane request lai deny garne
                 return jsonify({"error": "Invalid user"}), 401
@@ -43,3 +44,15 @@ def token_required(f): #check JWT tokens for protected routes and feteches the
         return f(current_user, *args, **kwargs)
 
     return decorated
+
+
+def role_required(*roles): # token_required, and the user's role must be one of roles (403 otherwise)
+    def decorator(f):
+        @wraps(f)
+        @token_required
+        def decorated(current_user, *args, **kwargs):
+            if current_user.role not in roles:
+                return jsonify({"error": "You are not allowed to access this resource"}), 403
+            return f(current_user, *args, **kwargs)
+        return decorated
+    return decorator
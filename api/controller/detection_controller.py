@@ -1,73 +1,43 @@
-import os
+import base64
+import csv
+import io
+import json
 import uuid
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from werkzeug.datastructures import FileStorage
 from database import db
-from api.service.detection_service import detect_image_type
-from api.controller.auth.auth_middleware import token_required
+from sqlalchemy import and_, delete, or_, select
+from api.service.detection_service import detect_image_type, detect_image_batch
+from api.service.job_queue import job_queue
+from api.service import geo, reference_data
+from api.service.incident_service import attach_to_incident, detach_from_incident, recompute_incidents
+from api.service.file_cleanup import file_cleanup
+from api.service.metrics import metrics
+from api.service import stats_service, tile_service
+from api.models.incident import Incident
+from api.controller.auth.auth_middleware import token_required, role_required
 from api.models.user_model import User 
 from api.models.detection_model import Detection
-from api.models.department import Department
 from api.models.image import Image
-from api.models.tag import Tag
 from api.models.relations import DetectionDepartment, DetectionTag
-from datetime import datetime
+from datetime import datetime, timedelta
 
 detection_bp = Blueprint('detection_bp', __name__, url_prefix='/detections')
 
 
-# POST — Detect and Save
-@detection_bp.route('/', methods=['POST'])
-@token_required
-def create_detection(current_user):
-    #Upload a detection (pothole or waste) Everything except the image is automatically determined.
-    image = request.files.get('image')
-    lat = request.form.get('latitude')
-    lon = request.form.get('longitude')
-    location = request.form.get('location')
-
-    if not image or not lat or not lon or not location:
-        return jsonify({'error': 'Missing required fields'}), 400
-
-    try:
-        latitude = float(lat)
-        longitude = float(lon)
-    except ValueError:
-        return jsonify({'error': 'Invalid latitude/longitude'}), 400
-
-    detection_type, result_data = detect_image_type(image)
-
-    if detection_type is None:
-        return jsonify({'message': 'No pothole or waste detected!'}), 200
-    
-    # # determine  severity/category and department automatically 
-    # pothole_severity = result_data.get("pothole_severity") if detection_type == "pothole" else None
-    # waste_category = result_data.get("waste_category") if detection_type == "waste" else None
-    # department = "Road Department" if detection_type == "pothole" else "Waste Management Department"
-
-
-    # Determine department and tags
+def _add_detection(current_user, detection_type, result_data, latitude, longitude, location):
+    # Adds a detection with its department, tags and image record to the session without flushing.
+    # Callers commit once: the whole upload (or batch) is written in that one transaction.
     if detection_type == 'pothole':
         department_name = "Road Department"
-        tag_names = [result_data.get('pothole_severity')] 
+        tag_names = [result_data.get('pothole_severity')]
     else:
         department_name = "Waste Management Department"
-        tag_names = [result_data.get('waste_category')] 
-
-    # Find or create department
-    department = Department.query.filter_by(name=department_name).first()
-    if not department:
-        department = Department(name=department_name)
-        db.session.add(department)
-        db.session.commit()
+        tag_names = [result_data.get('waste_category')]
 
-    # Construct paths for already uploaded images
-    image_name = image.filename
-    image_path = f"uploads/{detection_type}/{image_name}"
-    if detection_type == 'pothole':
-        detected_image_path = f"storage/pothole/detected/{image_name}"
-    else:
-        detected_image_path = f"storage/waste/detected/{image_name}"
-   
+    # Paths of the images saved by the detection service
+    image_path = f"storage/{detection_type}/original/{result_data['image_name']}"
+    detected_image_path = f"storage/{detection_type}/detected/{result_data['detected_image_name']}"
 
     # Store in database with user_id
     detection = Detection(
@@ -78,72 +48,277 @@ def create_detection(current_user):
         detection_type=detection_type,  # 'pothole' or 'waste'
         latitude=latitude,
         longitude=longitude,
+        geohash=geo.encode(latitude, longitude),
         location=location,
         timestamp=datetime.utcnow(),
         pothole_severity=result_data.get('pothole_severity'),
         waste_category=result_data.get('waste_category'),
         department=result_data.get('department'),
-        detection_status=result_data.get('detection_status')    
+        detection_status=result_data.get('detection_status'),
+        boxes=json.dumps(result_data['boxes']) if result_data.get('boxes') else None
     )
+    # duplicate reports of the same pothole / waste pile are grouped into one incident
+    attach_to_incident(detection)
     db.session.add(detection)
-    db.session.commit()
+    # dashboard counts and map tile cells are updated in the same transaction
+    stats_service.record_added(detection)
+    tile_service.record_added(detection)
 
-    # Link detection to department
-    det_dept = DetectionDepartment(
-        detection_id=detection.id,
-        department_id=department.id
-    )
-    db.session.add(det_dept)
-
-    # Link detection to tags
+    # Link detection to department and tags. Ids come from a per-process cache, so no lookups here,
+    # and the link rows are inserted together with the detection at commit time.
+    detection.departments.append(DetectionDepartment(department_id=reference_data.department_id(department_name)))
     for t_name in tag_names:
         if t_name:
-            tag = Tag.query.filter_by(name=t_name).first()
-            if not tag:
-                tag = Tag(name=t_name, type=detection_type)
-                db.session.add(tag)
-                db.session.commit()
-            det_tag = DetectionTag(detection_id=detection.id, tag_id=tag.id)
-            db.session.add(det_tag)
-
-    # Save uploaded image in Image table
-    filename = None
-    if image:
-        filename = f"{uuid.uuid4().hex}_{image.filename}"
-        folder = current_app.config.get('DETECTION_IMAGE_FOLDER')
-        if folder:
-            path = os.path.join(folder, filename)
-            image.save(path)
-
-        img_record = Image(
-            id=uuid.uuid4().hex,
-            detection_id=detection.id,
-            uploaded_filename=filename,
-            annotated_filename=None,
-            timestamp=str(datetime.utcnow())
-        )
-        db.session.add(img_record)
+            detection.tags.append(DetectionTag(tag_id=reference_data.tag_id(t_name, detection_type)))
 
-    db.session.commit()
+    # Image record points at the original stored by the detection service, the upload is not written twice
+    detection.images.append(Image(
+        id=uuid.uuid4().hex,
+        uploaded_filename=result_data['image_name'],
+        annotated_filename=None,
+        timestamp=str(datetime.utcnow())
+    ))
+    return detection
 
 
-    return jsonify({
+def _read_upload_form():
+    # Validates the single upload form. Returns (fields, None) or (None, error response)
+    image = request.files.get('image')
+    lat = request.form.get('latitude')
+    lon = request.form.get('longitude')
+    location = request.form.get('location')
+
+    if not image or not lat or not lon or not location:
+        return None, (jsonify({'error': 'Missing required fields'}), 400)
+
+    try:
+        latitude = float(lat)
+        longitude = float(lon)
+    except ValueError:
+        return None, (jsonify({'error': 'Invalid latitude/longitude'}), 400)
+
+    return (image, latitude, longitude, location), None
+
+
+def _detect_and_save(current_user, image, latitude, longitude, location):
+    # Runs detection on one upload and stores the result. Returns (response body, http status)
+    with metrics.stage("detect"):
+        detection_type, result_data = detect_image_type(image)
+
+    if detection_type is None and result_data is None:
+        return {'error': 'Detection models are not available'}, 503
+    if detection_type is None:
+        if result_data['detection_status'] == 'Invalid image':
+            return {'error': 'Uploaded file is not a valid image'}, 400
+        with metrics.stage("db_commit"):
+            db.session.commit()  # keeps the cached "no detection" result
+        return {'message': 'No pothole or waste detected!'}, 200
+
+    with metrics.stage("db_prepare"):
+        detection = _add_detection(current_user, detection_type, result_data, latitude, longitude, location)
+    with metrics.stage("db_commit"):
+        # serialized between flush and commit: the commit expires the objects and to_dict()
+        # would have to load them again
+        db.session.flush()
+        data = detection.to_dict()
+        db.session.commit()
+
+    return {
         'message': f'{detection_type.capitalize()} detected successfully.',
-        'data': detection.to_dict()
-    }), 201
+        'data': data
+    }, 201
+
+
+# POST — Detect and Save
+@detection_bp.route('/', methods=['POST'])
+@token_required
+def create_detection(current_user):
+    #Upload a detection (pothole or waste) Everything except the image is automatically determined.
+    fields, error = _read_upload_form()
+    if error:
+        return error
+
+    body, status = _detect_and_save(current_user, *fields)
+    return jsonify(body), status
+
+
+def _run_detection_job(user_id, filename, content_type, data, latitude, longitude, location):
+    # Runs on a job worker thread (inside its own app context)
+    current_user = db.session.get(User, user_id)
+    image = FileStorage(stream=io.BytesIO(data), filename=filename, content_type=content_type)
+    body, status = _detect_and_save(current_user, image, latitude, longitude, location)
+    return {'status_code': status, **body}
+
+
+# POST — Detect and Save in the background, answers right away with a job id
+@detection_bp.route('/jobs', methods=['POST'])
+@token_required
+def create_detection_job(current_user):
+    fields, error = _read_upload_form()
+    if error:
+        return error
+
+    image, latitude, longitude, location = fields
+    # the upload stream is closed after the request, so the job gets its own copy of the bytes
+    job_id = job_queue.submit(current_user.id, _run_detection_job, current_user.id, image.filename,
+                              image.content_type, image.read(), latitude, longitude, location)
+    if job_id is None:
+        return jsonify({'error': 'Too many detection jobs waiting, try again later'}), 503
+
+    return jsonify({
+        'message': 'Detection job accepted',
+        'job_id': job_id,
+        'status_url': f"{request.script_root}/api/detections/jobs/{job_id}"
+    }), 202
+
+
+# GET — Status (and result once finished) of a detection job
+@detection_bp.route('/jobs/<string:job_id>', methods=['GET'])
+@token_required
+def get_detection_job(current_user, job_id):
+    job = job_queue.get(job_id)
+    if not job or job['owner_id'] != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+
+    job.pop('owner_id')
+    return jsonify(job), 200
+
+
+# POST — Detect and Save a batch of images (field crews syncing many photos at once)
+@detection_bp.route('/batch', methods=['POST'])
+@token_required
+def create_detection_batch(current_user):
+    # images are sent as repeated "images" files. latitude/longitude/location can be sent
+    # once (used for every image) or once per image in the same order as the files.
+    images = request.files.getlist('images')
+    lats = request.form.getlist('latitude')
+    lons = request.form.getlist('longitude')
+    locations = request.form.getlist('location')
+
+    if not images or not lats or not lons or not locations:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    max_batch = current_app.config.get('MAX_BATCH_SIZE', 200)
+    if len(images) > max_batch:
+        return jsonify({'error': f'Too many images, maximum is {max_batch}'}), 400
 
+    if any(len(values) not in (1, len(images)) for values in (lats, lons, locations)):
+        return jsonify({'error': 'latitude, longitude and location must be sent once or once per image'}), 400
 
+    try:
+        latitudes = [float(v) for v in lats]
+        longitudes = [float(v) for v in lons]
+    except ValueError:
+        return jsonify({'error': 'Invalid latitude/longitude'}), 400
+
+    def pick(values, index):
+        return values[index] if len(values) > 1 else values[0]
+
+    with metrics.stage("detect"):
+        outcomes = detect_image_batch(images)
+    if outcomes is None:
+        return jsonify({'error': 'Detection models are not available'}), 503
+
+    results = []
+    created = []
+    for index, (image, (detection_type, result_data)) in enumerate(zip(images, outcomes)):
+        if detection_type is None:
+            results.append({
+                'index': index,
+                'filename': image.filename,
+                'message': result_data['detection_status'],
+                'data': None
+            })
+            continue
+
+        detection = _add_detection(current_user, detection_type, result_data,
+                                   pick(latitudes, index), pick(longitudes, index), pick(locations, index))
+        created.append(detection)
+        results.append({
+            'index': index,
+            'filename': image.filename,
+            'message': f'{detection_type.capitalize()} detected successfully.',
+            'data': detection
+        })
+
+    # all rows of the batch are written in one transaction, serialized before the commit
+    # expires them (see _detect_and_save)
+    with metrics.stage("db_commit"):
+        db.session.flush()
+        for item in results:
+            if item['data'] is not None:
+                item['data'] = item['data'].to_dict()
+        db.session.commit()
+
+    return jsonify({
+        'message': f'{len(created)} of {len(images)} images had a detection.',
+        'results': results
+    }), 201 if created else 200
+
+
+
+def _encode_cursor(record):
+    raw = f"{record.timestamp.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-#  GET — All detections(current user detections only)
+
+def _decode_cursor(cursor):
+    timestamp, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(id)
+
+
+def _keyset_page(query):
+    # Newest first, ?limit= rows after the ?after= cursor. Returns (records, next cursor or None)
+    # or raises ValueError on bad parameters. Seeks by (timestamp, id) so every page costs the same.
+    default_limit = current_app.config.get('DETECTION_PAGE_SIZE', 100)
+    max_limit = current_app.config.get('DETECTION_PAGE_MAX', 500)
+    try:
+        limit = int(request.args.get('limit', default_limit))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, max_limit)
+
+    after = request.args.get('after')
+    if after:
+        try:
+            timestamp, id = _decode_cursor(after)
+        except Exception:
+            raise ValueError('Invalid cursor')
+        query = query.filter(or_(
+            Detection.timestamp < timestamp,
+            and_(Detection.timestamp == timestamp, Detection.id < id)
+        ))
+
+    # one extra row tells us whether there is a next page
+    records = query.order_by(Detection.timestamp.desc(), Detection.id.desc()).limit(limit + 1).all()
+    next_cursor = _encode_cursor(records[limit - 1]) if len(records) > limit else None
+    return records[:limit], next_cursor
+
+
+def _page_response(records, next_cursor, **to_dict_args):
+    response = jsonify([r.to_dict(**to_dict_args) for r in records])
+    if next_cursor:
+        # the body stays a plain list, the cursor for ?after= travels in a header
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+
+#  GET — All detections(current user detections only), paginated with ?limit=&after=
 @detection_bp.route('/my', methods=['GET'])
 @token_required
 def get_my_detections(current_user):
-    records = Detection.query.filter(Detection.user_id == current_user.id).all()
+    try:
+        records, next_cursor = _keyset_page(Detection.query.options(*Detection.serialize_options())
+                                            .filter(Detection.user_id == current_user.id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     # this is feteching dtetctions from db using query
-    if not records:
+    if not records and not request.args.get('after'):
         return jsonify({'message': 'No detections found for this user'}), 200
 
-    return jsonify([r.to_dict() for r in records]), 200
+    return _page_response(records, next_cursor)
 
 #  GET — All by type(like pthole/waste) for current user
 @detection_bp.route('/my/<string:detection_type>', methods=['GET'])
@@ -153,11 +328,312 @@ def get_my_by_type(current_user, detection_type): # using current_user from the
     if detection_type not in ['pothole', 'waste']:
         return jsonify({'error': 'Invalid detection type'}), 400
 
-    records = Detection.query.filter_by(
-        user_id=current_user.id, detection_type=detection_type).all()
+    try:
+        records, next_cursor = _keyset_page(Detection.query.options(*Detection.serialize_options()).filter_by(
+            user_id=current_user.id, detection_type=detection_type))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return _page_response(records, next_cursor)
+
+
+def _query_limit():
+    # ?limit= for the spatial routes, capped so one request can't pull the whole table
+    max_limit = current_app.config.get('SPATIAL_QUERY_MAX_LIMIT', 5000)
+    try:
+        return min(max(int(request.args.get('limit', 500)), 1), max_limit)
+    except ValueError:
+        return None
+
+
+def _spatial_filters(min_lat, min_lon, max_lat, max_lon):
+    # Candidates from the geohash index (cells covering the box), then the exact box check
+    cells = geo.covering_cells(min_lat, min_lon, max_lat, max_lon)
+    filters = [
+        geo.cells_filter(Detection.geohash, cells),
+        Detection.latitude.between(min_lat, max_lat),
+        Detection.longitude.between(min_lon, max_lon)
+    ]
+    detection_type = request.args.get('type')
+    if detection_type:
+        filters.append(Detection.detection_type == detection_type)
+    return filters
+
+
+# GET — Detections within ?radius= metres (default 500) of ?lat=&lon=, nearest first (admin / organization)
+@detection_bp.route('/near', methods=['GET'])
+@role_required('admin', 'organization')
+def get_near(current_user):
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        radius = float(request.args.get('radius', 500))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lon are required, radius is in metres'}), 400
+
+    max_radius = current_app.config.get('SPATIAL_MAX_RADIUS_M', 10000)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not (0 < radius <= max_radius):
+        return jsonify({'error': f'Invalid point or radius (max {max_radius} m)'}), 400
+
+    limit = _query_limit()
+    if limit is None:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    # The box around the circle only narrows candidates down, exact distance decides.
+    # Only id and position of the candidates are read; full rows are loaded for the nearest ones.
+    max_candidates = current_app.config.get('SPATIAL_MAX_CANDIDATES', 20000)
+    candidates = db.session.execute(
+        select(Detection.id, Detection.latitude, Detection.longitude)
+        .where(*_spatial_filters(*geo.bbox_around(lat, lon, radius)))
+        .limit(max_candidates + 1)
+    ).all()
+    if len(candidates) > max_candidates:
+        return jsonify({'error': 'Too many detections in this area, use a smaller radius or a type'}), 400
+
+    matches = []
+    for id, latitude, longitude in candidates:
+        distance = geo.haversine_m(lat, lon, latitude, longitude)
+        if distance <= radius:
+            matches.append((distance, id))
+    matches.sort()
+    matches = matches[:limit]
+
+    records = Detection.query.options(*Detection.serialize_options()).filter(
+        Detection.id.in_([id for _, id in matches])).all() if matches else []
+    records = {record.id: record for record in records}
+    data = []
+    for distance, id in matches:
+        item = records[id].to_dict()
+        item['distance_m'] = round(distance, 1)
+        data.append(item)
+    return jsonify(data), 200
+
+
+def _parse_bbox(value):
+    # "min_lon,min_lat,max_lon,max_lat" -> (min_lat, min_lon, max_lat, max_lon), ValueError if invalid
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(v) for v in value.split(',')]
+    except ValueError:
+        raise ValueError('bbox must be min_lon,min_lat,max_lon,max_lat')
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise ValueError('Invalid bbox (latitudes -90..90, longitudes -180..180, min before max)')
+    return min_lat, min_lon, max_lat, max_lon
+
+
+# GET — Detections inside ?bbox=min_lon,min_lat,max_lon,max_lat (admin / organization)
+@detection_bp.route('/within', methods=['GET'])
+@role_required('admin', 'organization')
+def get_within(current_user):
+    if not request.args.get('bbox'):
+        return jsonify({'error': 'bbox=min_lon,min_lat,max_lon,max_lat is required'}), 400
+    try:
+        min_lat, min_lon, max_lat, max_lon = _parse_bbox(request.args['bbox'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    limit = _query_limit()
+    if limit is None:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    records = (Detection.query.options(*Detection.serialize_options())
+               .filter(*_spatial_filters(min_lat, min_lon, max_lat, max_lon)).limit(limit).all())
     return jsonify([r.to_dict() for r in records]), 200
 
 
+# columns written by GET /export, in this order (CSV header)
+EXPORT_COLUMNS = (
+    Detection.id, Detection.detection_type, Detection.latitude, Detection.longitude, Detection.location,
+    Detection.timestamp, Detection.pothole_severity, Detection.waste_category, Detection.department,
+    Detection.detection_status, Detection.incident_id, Detection.user_id, Detection.image_path,
+    Detection.detected_image_path,
+)
+
+
+def _parse_date(value, end=False):
+    # YYYY-MM-DD or an ISO datetime; a plain end date includes that whole day
+    if len(value) == 10:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1) if end else day
+    return datetime.fromisoformat(value)
+
+
+def _export_query():
+    # Filters of GET /export as a SELECT of plain columns (no ORM objects, nothing per row)
+    query = select(*EXPORT_COLUMNS).order_by(Detection.id)
+
+    detection_type = request.args.get('type')
+    if detection_type:
+        if detection_type not in ['pothole', 'waste']:
+            raise ValueError('Invalid detection type')
+        query = query.where(Detection.detection_type == detection_type)
+
+    try:
+        if request.args.get('from'):
+            query = query.where(Detection.timestamp >= _parse_date(request.args['from']))
+        if request.args.get('to'):
+            query = query.where(Detection.timestamp < _parse_date(request.args['to'], end=True))
+    except ValueError:
+        raise ValueError('from/to must be YYYY-MM-DD or ISO datetimes')
+
+    if request.args.get('bbox'):
+        min_lat, min_lon, max_lat, max_lon = _parse_bbox(request.args['bbox'])
+        query = query.where(
+            geo.cells_filter(Detection.geohash, geo.covering_cells(min_lat, min_lon, max_lat, max_lon)),
+            Detection.latitude.between(min_lat, max_lat),
+            Detection.longitude.between(min_lon, max_lon)
+        )
+    return query
+
+
+def _export_rows(query, batch_size):
+    # yield_per streams the result (server-side cursor on PostgreSQL): only one batch of rows
+    # is in memory at a time, however many rows match
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        yield rows
+
+
+_TIMESTAMP_INDEX = EXPORT_COLUMNS.index(Detection.timestamp)
+
+
+def _export_values(row): # row as a list, timestamp formatted like to_dict()
+    values = list(row)
+    if values[_TIMESTAMP_INDEX] is not None:
+        values[_TIMESTAMP_INDEX] = values[_TIMESTAMP_INDEX].strftime("%Y-%m-%d %H:%M:%S")
+    return values
+
+
+def _ndjson_chunks(query, batch_size):
+    names = [column.key for column in EXPORT_COLUMNS]
+    for rows in _export_rows(query, batch_size):
+        yield "".join(json.dumps(dict(zip(names, _export_values(row)))) + "\n" for row in rows)
+
+
+def _csv_chunks(query, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.key for column in EXPORT_COLUMNS])
+    for rows in _export_rows(query, batch_size):
+        writer.writerows(_export_values(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()  # header only when nothing matched
+
+
+# GET — Export all detections for GIS tools, streamed as ?format=ndjson (default) or csv.
+# Filters: ?type=, ?from=&to= (dates), ?bbox=min_lon,min_lat,max_lon,max_lat. Admins and organizations only.
+@detection_bp.route('/export', methods=['GET'])
+@role_required('admin', 'organization')
+def export_detections(current_user):
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        query = _export_query()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    if export_format == 'csv':
+        chunks, mimetype = _csv_chunks(query, batch_size), 'text/csv'
+    else:
+        chunks, mimetype = _ndjson_chunks(query, batch_size), 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=detections.{export_format}'
+    })
+
+
+# GET — Dashboard counts per ?bucket=day|week (default day), from the detection_stats rollup.
+# ?group_by=type,department,severity,category (default type), ?from=&to= (dates) and the filters
+# ?type= ?department= ?severity= ?category=
+@detection_bp.route('/stats', methods=['GET'])
+@token_required
+def get_stats(current_user):
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in stats_service.PERIODS:
+        return jsonify({'error': 'bucket must be day or week'}), 400
+
+    group_by = [name for name in request.args.get('group_by', 'type').split(',') if name]
+    unknown = [name for name in group_by if name not in stats_service.DIMENSIONS]
+    if unknown:
+        return jsonify({'error': f"Unknown group_by {', '.join(unknown)}, "
+                                 f"expected {', '.join(stats_service.DIMENSIONS)}"}), 400
+
+    try:
+        start = _parse_date(request.args['from']).date() if request.args.get('from') else None
+        end = _parse_date(request.args['to']).date() if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+
+    filters = {name: request.args[name] for name in stats_service.DIMENSIONS if request.args.get(name)}
+    return jsonify({
+        'bucket': bucket,
+        'group_by': group_by,
+        'results': stats_service.query_stats(bucket, group_by, start, end, filters)
+    }), 200
+
+
+# GET — Map tile: detection counts per grid cell (by type and severity / category) inside the
+# web mercator tile z/x/y, from the pre-aggregated detection_tile_cells. ?type= keeps one type.
+# Admin / organization only: at high zoom a cell with one report is that user's exact position.
+@detection_bp.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@role_required('admin', 'organization')
+def get_tile(current_user, z, x, y):
+    max_zoom = tile_service.tile_cache.max_zoom
+    if z > max_zoom:
+        return jsonify({'error': f'Maximum zoom is {max_zoom}, use /within for single detections'}), 400
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': 'Tile out of range'}), 404
+
+    tile = tile_service.tile_cache.get(z, x, y)
+    detection_type = request.args.get('type')
+    if detection_type:
+        if detection_type not in ['pothole', 'waste']:
+            return jsonify({'error': 'Invalid detection type'}), 400
+        cells = []
+        for cell in tile['cells']:
+            counts = cell['counts'].get(detection_type)
+            if counts:
+                cells.append({**cell, 'counts': {detection_type: counts}, 'total': sum(counts.values())})
+        tile = {**tile, 'cells': cells}
+
+    response = jsonify(tile)
+    response.cache_control.private = True
+    response.cache_control.max_age = tile_service.tile_cache.ttl
+    return response, 200
+
+
+# GET — Incidents (duplicate reports grouped together), most recently reported first (admin / organization)
+@detection_bp.route('/incidents', methods=['GET'])
+@role_required('admin', 'organization')
+def get_incidents(current_user):
+    query = Incident.query
+    detection_type = request.args.get('type')
+    if detection_type:
+        if detection_type not in ['pothole', 'waste']:
+            return jsonify({'error': 'Invalid detection type'}), 400
+        query = query.filter(Incident.detection_type == detection_type)
+
+    limit = _query_limit()
+    if limit is None:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    records = query.order_by(Incident.last_reported_at.desc()).limit(limit).all()
+    return jsonify([r.to_dict() for r in records]), 200
+
+
+# GET — One incident with the detections reported for it (admin / organization)
+@detection_bp.route('/incidents/<int:id>', methods=['GET'])
+@role_required('admin', 'organization')
+def get_incident(current_user, id):
+    incident = db.get_or_404(Incident, id)
+    data = incident.to_dict()
+    detections = Detection.query.options(*Detection.serialize_options()).filter_by(incident_id=incident.id) \
+        .order_by(Detection.timestamp.desc()).all()
+    data['detections'] = [d.to_dict() for d in detections]
+    return jsonify(data), 200
+
+
 #  GET — single detection by id of the image for current user
 
 @detection_bp.route('/my/<int:id>', methods=['GET'])
@@ -167,11 +643,16 @@ def get_my_single(current_user, id):
     return jsonify(record.to_dict()), 200
 
 
-#GET — All detections for current user(uses relationship defined in the user model)
+#GET — All detections for current user with user info, paginated with ?limit=&after=
 @detection_bp.route('/user', methods=['GET'])
 @token_required
 def my_detections(current_user):
-    return jsonify([d.to_dict(include_user=True) for d in current_user.detections]), 200
+    try:
+        records, next_cursor = _keyset_page(Detection.query.options(*Detection.serialize_options(include_user=True))
+                                            .filter(Detection.user_id == current_user.id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return _page_response(records, next_cursor, include_user=True)
 #Note: user info ko lagi chai detection model ma to_dict() dunction ma include_user parameter add gareko xa so
 
 
@@ -230,16 +711,16 @@ def delete_my_detection(current_user, id):
     if not record:
         return jsonify({'error': 'Record not found'}), 404
 
-    # Remove stored image from disk
-    folder = current_app.config.get('DETECTION_IMAGE_FOLDER')
-    if folder and record.image_name:
-        image_path = os.path.join(folder, record.image_name)
-        if os.path.exists(image_path):
-            os.remove(image_path)
-
+    files = [record.image_path, record.detected_image_path]
+    detach_from_incident(record)
+    stats_service.record_removed([record])
+    tile_service.record_removed([record])
     db.session.delete(record)
     db.session.commit()
 
+    # Remove stored images from disk in the background
+    file_cleanup.enqueue(files)
+
     return jsonify({'message': f'{record.detection_type.capitalize()} deleted successfully'}), 200
 
 
@@ -250,22 +731,41 @@ def delete_all_my_by_type(current_user, detection_type):
     if detection_type not in ['pothole', 'waste']:
         return jsonify({'error': 'Invalid detection type'}), 400
 
-    records = Detection.query.filter_by(
-        user_id=current_user.id, detection_type=detection_type).all()
-
-    folder = current_app.config.get('DETECTION_IMAGE_FOLDER')
-
-    for record in records:
-        # Remove stored image from disk
-        if folder and record.image_name:
-            image_path = os.path.join(folder, record.image_name)
-            if os.path.exists(image_path):
-                os.remove(image_path)
-        db.session.delete(record)
-
-    db.session.commit()
+    count = _delete_detections(and_(Detection.user_id == current_user.id, Detection.detection_type == detection_type))
 
     return jsonify({
         "message": f"All {detection_type} records deleted successfully.",
-        "count": len(records)
-    }), 200
\ No newline at end of file
+        "count": count
+    }), 200
+
+
+def _delete_detections(condition, chunk_size=1000):
+    # Set-based delete of every detection matching condition: a few DELETE ... WHERE statements
+    # instead of loading and deleting rows one by one. Returns the number of detections deleted.
+    # only the columns needed afterwards are read: file paths, incidents to recount, stats and tile keys
+    rows = db.session.execute(
+        select(Detection.image_path, Detection.detected_image_path, Detection.incident_id,
+               Detection.detection_type, Detection.department, Detection.pothole_severity,
+               Detection.waste_category, Detection.timestamp, Detection.latitude, Detection.longitude,
+               Detection.id).where(condition)
+    ).all()
+    if not rows:
+        return 0
+
+    # deleted by id, not by condition again: a detection committed after the SELECT above must not
+    # be deleted without its stats, tile cells and files being removed too
+    ids = [row.id for row in rows]
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        for model in (DetectionTag, DetectionDepartment, Image):
+            db.session.execute(delete(model).where(model.detection_id.in_(chunk)),
+                               execution_options={"synchronize_session": False})
+        db.session.execute(delete(Detection).where(Detection.id.in_(chunk)), execution_options={"synchronize_session": False})
+    recompute_incidents({row.incident_id for row in rows if row.incident_id is not None})
+    stats_service.record_removed(rows)
+    tile_service.record_removed(rows)
+    db.session.commit()
+
+    # files are removed by the background cleanup worker, in batches
+    file_cleanup.enqueue(path for row in rows for path in row[:2])
+    return len(rows)
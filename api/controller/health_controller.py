@@ -0,0 +1,37 @@
+from flask import Blueprint, jsonify
+from api.service.model_manager import model_manager
+from api.service.result_cache import result_cache
+from api.service.inference_batcher import inference_batcher
+
+health_bp = Blueprint('health_bp', __name__, url_prefix='/health')
+
+
+# GET — Liveness, the process is up and answering
+@health_bp.route('/live', methods=['GET'])
+def live():
+    return jsonify({'status': 'ok'}), 200
+
+
+# GET — Readiness, 503 while a model failed to load (load state and times per model)
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    ready_now = model_manager.is_ready()
+    if not ready_now:
+        # a failed model is loaded again once MODEL_RETRY_SECONDS have passed
+        ready_now = model_manager.available() and model_manager.is_ready()
+    return jsonify({
+        'status': 'ready' if ready_now else 'not ready',
+        'models': model_manager.status()
+    }), 200 if ready_now else 503
+
+
+# GET — Hit/miss counters of the detection result cache
+@health_bp.route('/cache', methods=['GET'])
+def cache():
+    return jsonify(result_cache.stats()), 200
+
+
+# GET — Micro-batching stats: batch sizes and queue wait per model
+@health_bp.route('/batching', methods=['GET'])
+def batching():
+    return jsonify(inference_batcher.stats()), 200
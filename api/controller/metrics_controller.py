@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+from api.service.metrics import metrics
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+# GET — Counters and latency histograms in the Prometheus text format
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -4,7 +4,11 @@ from .department import Department
 from .image import Image
 from .tag import Tag
 from .relations import DetectionDepartment, DetectionTag
+from .detection_cache import DetectionCache
+from .incident import Incident
+from .detection_stat import DetectionStat
+from .detection_tile_cell import DetectionTileCell
 from database import db
 
 # creating a helper list of all models
-all_models = [User, Detection, Department, Image, Tag, DetectionDepartment, DetectionTag]
+all_models = [User, Detection, Department, Image, Tag, DetectionDepartment, DetectionTag, DetectionCache, Incident, DetectionStat, DetectionTileCell]
@@ -0,0 +1,12 @@
+from database import db
+from datetime import datetime
+
+class DetectionCache(db.Model):
+    __tablename__ = "detection_cache"
+
+    # sha256 of the uploaded bytes + version of the models that produced the result
+    image_hash = db.Column(db.String(64), primary_key=True)
+    model_version = db.Column(db.String(64), primary_key=True)
+    detection_type = db.Column(db.String(20), nullable=True)  # pothole / waste / None = nothing detected
+    result = db.Column(db.Text, nullable=False)  # result_data as JSON (severity/category, image names, ...)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
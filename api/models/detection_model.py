@@ -1,5 +1,7 @@
+import json
 from database import db
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
 from api.models.image import Image
 from api.models.relations import DetectionDepartment, DetectionTag
 
@@ -8,12 +10,15 @@ class Detection(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)  # Who uploaded it
+    incident_id = db.Column(db.Integer, db.ForeignKey("incidents.id"), nullable=True, index=True)  # duplicate reports share one incident
     detection_type = db.Column(db.String(20), nullable=False)  # pothole / waste
     image_name = db.Column(db.String(200), nullable=False)
     image_path = db.Column(db.String(300), nullable=False)  # original uploaded image
-    detected_image_path = db.Column(db.String(300), nullable=True) # YOLO output image
+    detected_image_path = db.Column(db.String(300), nullable=True, index=True) # YOLO output image (rendered on first request)
+    boxes = db.Column(db.Text, nullable=True)  # JSON [[x1, y1, x2, y2, conf, label], ...] normalised 0..1
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)  # spatial index for /near and /within
     location = db.Column(db.String(255), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     pothole_severity = db.Column(db.String(20), nullable=True)
@@ -24,11 +29,26 @@ class Detection(db.Model):
 
     # user = db.relationship("User", backref=db.backref("detections", lazy=True))
 
+    # the /my listings read newest first per user (and per type), keyset pagination walks these indexes
+    __table_args__ = (
+        db.Index("ix_detections_user_type_timestamp", "user_id", "detection_type", timestamp.desc(), id.desc()),
+        db.Index("ix_detections_user_timestamp", "user_id", timestamp.desc(), id.desc()),
+    )
+
     # Relationships
     departments = db.relationship("DetectionDepartment",backref="detection",lazy=True,cascade="all, delete-orphan")
     tags = db.relationship("DetectionTag",backref="detection",lazy=True,cascade="all, delete-orphan")
     images = db.relationship("Image",backref="detection",lazy=True,cascade="all, delete-orphan")
 
+    @staticmethod
+    def serialize_options(include_user=False):
+        # Loader options for queries whose rows go through to_dict(): tags (and user) are loaded
+        # with a couple of extra queries for the whole list instead of one or two per row
+        options = [selectinload(Detection.tags).joinedload(DetectionTag.tag)]
+        if include_user:
+            options.append(joinedload(Detection.user))
+        return options
+
     def to_dict(self, include_user=False):
         data={
             "id": self.id,
@@ -45,6 +65,8 @@ class Detection(db.Model):
             "department": self.department,
             "timestamp": self.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
             "detection_status": self.detection_status,
+            "incident_id": self.incident_id,
+            "boxes": json.loads(self.boxes) if self.boxes else [],
             "tags": [t.tag.name for t in self.tags] 
         }
         if include_user:
@@ -0,0 +1,15 @@
+from database import db
+
+class DetectionStat(db.Model):
+    # Detection counts per day / week and dimension, kept up to date by every insert and delete of
+    # a detection so dashboards read a few rows per bucket instead of scanning detections.
+    # Missing severity / category are stored as '' because they are part of the primary key.
+    __tablename__ = "detection_stats"
+
+    period = db.Column(db.String(5), primary_key=True)  # day / week
+    period_start = db.Column(db.Date, primary_key=True)  # the day, or the monday of the week
+    detection_type = db.Column(db.String(20), primary_key=True)
+    department = db.Column(db.String(100), primary_key=True)
+    pothole_severity = db.Column(db.String(20), primary_key=True, default='')
+    waste_category = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,14 @@
+from database import db
+
+class DetectionTileCell(db.Model):
+    # Detection counts per geohash cell at several precisions, the data behind the map tiles.
+    # Kept up to date by every insert and delete of a detection (see tile_service).
+    __tablename__ = "detection_tile_cells"
+
+    precision = db.Column(db.Integer, primary_key=True)  # geohash length of the cell
+    geohash = db.Column(db.String(12), primary_key=True)
+    detection_type = db.Column(db.String(20), primary_key=True)
+    label = db.Column(db.String(50), primary_key=True, default='')  # pothole severity / waste category
+    count = db.Column(db.Integer, nullable=False, default=0)
+    latitude_sum = db.Column(db.Float, nullable=False, default=0.0)  # for the centroid of the points
+    longitude_sum = db.Column(db.Float, nullable=False, default=0.0)
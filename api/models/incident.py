@@ -0,0 +1,34 @@
+from database import db
+from datetime import datetime
+
+class Incident(db.Model):
+    # One real pothole / waste pile. Every detection reported near it is attached to it.
+    __tablename__ = "incidents"
+
+    id = db.Column(db.Integer, primary_key=True)
+    detection_type = db.Column(db.String(20), nullable=False)  # pothole / waste
+    latitude = db.Column(db.Float, nullable=False)   # mean position of the attached detections
+    longitude = db.Column(db.Float, nullable=False)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    report_count = db.Column(db.Integer, nullable=False, default=1)
+    pothole_severity = db.Column(db.String(20), nullable=True)  # worst severity reported
+    waste_category = db.Column(db.String(50), nullable=True)    # latest category reported
+    department = db.Column(db.String(100), nullable=False)
+    first_reported_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_reported_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    detections = db.relationship("Detection", backref="incident", lazy=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "detection_type": self.detection_type,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "report_count": self.report_count,
+            "pothole_severity": self.pothole_severity,
+            "waste_category": self.waste_category,
+            "department": self.department,
+            "first_reported_at": self.first_reported_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "last_reported_at": self.last_reported_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
@@ -0,0 +1,55 @@
+import os
+import tempfile
+from PIL import Image as PILImage, ImageDraw, ImageFont, ImageOps
+
+# box colour per label, anything else falls back to the first one
+LABEL_COLORS = {
+    "minor_pothole": (255, 193, 7),
+    "medium_pothole": (255, 120, 0),
+    "major_pothole": (220, 20, 60),
+}
+DEFAULT_COLORS = [(0, 114, 255), (0, 200, 83), (170, 0, 255), (255, 64, 129), (0, 188, 212)]
+
+
+def box_rows(result):
+    # Compact form of a YOLO result stored with the detection:
+    # [x1, y1, x2, y2, confidence, label] with coordinates normalised to 0..1
+    rows = []
+    for (x1, y1, x2, y2), confidence, class_id in zip(result.boxes.xyxyn.tolist(),
+                                                      result.boxes.conf.tolist(),
+                                                      result.boxes.cls.tolist()):
+        rows.append([round(x1, 4), round(y1, 4), round(x2, 4), round(y2, 4),
+                     round(confidence, 3), result.names[int(class_id)]])
+    return rows
+
+
+def render(original_path, boxes, target_path):
+    # Draws the stored boxes on the original image and writes the annotated JPEG to target_path
+    with PILImage.open(original_path) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    line_width = max(2, round(max(image.size) / 300))
+
+    labels = sorted({row[5] for row in boxes})
+    for x1, y1, x2, y2, confidence, label in boxes:
+        color = LABEL_COLORS.get(label, DEFAULT_COLORS[labels.index(label) % len(DEFAULT_COLORS)])
+        rect = [x1 * image.width, y1 * image.height, x2 * image.width, y2 * image.height]
+        draw.rectangle(rect, outline=color, width=line_width)
+        text = f"{label} {confidence:.2f}"
+        left, top, right, bottom = draw.textbbox((rect[0], rect[1]), text, font=font)
+        text_top = max(rect[1] - (bottom - top) - 4, 0)
+        draw.rectangle([rect[0], text_top, rect[0] + (right - left) + 4, text_top + (bottom - top) + 4], fill=color)
+        draw.text((rect[0] + 2, text_top + 2), text, fill=(255, 255, 255), font=font)
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    # written to a unique temp file next to the target and renamed, readers never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            image.save(temp_file, 'JPEG', quality=90)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -1,99 +1,303 @@
+import io
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from flask import current_app
-from ultralytics import YOLO
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+from api.service.model_manager import model_manager
+from api.service.model_backends import artifact_path
+from api.service.result_cache import result_cache, image_hash
+from api.service.inference_batcher import inference_batcher
+from api.service.metrics import metrics
+from api.service import storage
+from api.service.annotation_renderer import box_rows
 
-# Load models once
+# Models are registered by create_app() and loaded on first use (see model_manager)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 POTHOLE_MODEL_PATH = os.path.join(BASE_DIR, '..', 'models', 'best.pt')
 WASTE_MODEL_PATH = os.path.join(BASE_DIR, '..', 'models', 'waste.pt')
+MODEL_WEIGHTS = {"pothole": POTHOLE_MODEL_PATH, "waste": WASTE_MODEL_PATH}
 
-try:
-    POTHOLE_MODEL = YOLO(POTHOLE_MODEL_PATH)
-    WASTE_MODEL = YOLO(WASTE_MODEL_PATH)
-except Exception as e:
-    print("Error loading YOLO models:", e)
-    POTHOLE_MODEL = None
-    WASTE_MODEL = None
 
+def register_models(app):
+    # Registers every model on the backend chosen in the config (<NAME>_MODEL_BACKEND, MODEL_INT8)
+    for name, weights_path in MODEL_WEIGHTS.items():
+        backend = app.config.get(f'{name.upper()}_MODEL_BACKEND', 'pytorch')
+        model_manager.register(name, artifact_path(weights_path, backend, app.config.get('MODEL_INT8', False)))
 
-def detect_image_type(image): #Detect pothole or waste and save images to the correct storage folders
 
-    if not POTHOLE_MODEL or not WASTE_MODEL:
-        return None, None
+# When both models find something the first one in this order wins (DETECTION_MODE = "parallel")
+DETECTION_PRIORITY = ("pothole", "waste")
 
-    timestamp = int(time.time())
-    original_filename = f"{timestamp}_{image.filename}"
-    detected_filename = f"{timestamp}_detected_{image.filename}"
-
-    #  Saving the  ORIGINAL images
-    pothole_original_path = os.path.join(current_app.config['POTHOLE_ORIGINAL_FOLDER'], original_filename)
-    waste_original_path = os.path.join(current_app.config['WASTE_ORIGINAL_FOLDER'], original_filename)
-
-    # Save one temporary copy to run detection
-    temp_path = os.path.join(current_app.config['STORAGE_FOLDER'], f"temp_{original_filename}")
-    image.save(temp_path)
-
-    # -----------------Run POTHOLE detection------------------
-    pothole_results = POTHOLE_MODEL.predict(source=temp_path, save=False, conf=0.5)
-
-    if len(pothole_results[0].boxes) > 0:
-        # Save original inside pothole/original
-        pothole_original_path = os.path.join(current_app.config['POTHOLE_ORIGINAL_FOLDER'], original_filename)
-        # Save detected inside pothole/detected
-        pothole_detected_path = os.path.join(current_app.config['POTHOLE_DETECTED_FOLDER'], detected_filename)
-        image.save(pothole_original_path)
-        pothole_results[0].save(filename=pothole_detected_path)
-
-        # Extracting severity from YOLO class name
-        class_name = pothole_results[0].names[int(pothole_results[0].boxes.cls[0].item())]
-        
-        # class_name will be like "minor_pothole", "medium_pothole", "major_pothole"
-        pothole_severity = class_name.split('_')[0]  # get "minor", "medium", or "major"
-
-        os.remove(temp_path)
-        return "pothole", {
-            "image_name": original_filename,
-            "pothole_severity": pothole_severity,
-            "waste_category": None,
-            "detection_status": f"{pothole_severity} pothole is detected.",
-            "department": "Road Department"
-        }
-
-    # ------------------ Run WASTE detection ------------------
-    waste_results = WASTE_MODEL.predict(source=temp_path, save=False, conf=0.5)
-
-    if len(waste_results[0].boxes) > 0:
-        # Save original inside waste/original
-        waste_original_path = os.path.join(current_app.config['WASTE_ORIGINAL_FOLDER'], original_filename)
-        image.save(waste_original_path)
-
-        # Save detected inside waste/detected
-        waste_detected_path = os.path.join(current_app.config['WASTE_DETECTED_FOLDER'], detected_filename)
-        waste_results[0].save(filename=waste_detected_path)
-
-
-        #mapping YOLO class to waste category
-        first_class = int(waste_results[0].boxes.cls[0].item())
-        CLASS_MAP = {0: 'Glass', 1: 'Metal', 2: 'Paper', 3: 'Plastic', 4: 'Residual'}
-        category = CLASS_MAP.get(first_class, "Unknown")
-
-        os.remove(temp_path)
-        return "waste", {
-            "image_name": original_filename,
-            "pothole_severity": None,
-            "waste_category": category,
-            "detection_status": f"{category} is detected",
-            "department": "Waste Management Department"
-        }
-
-    # No detection = delete temp file
-    os.remove(temp_path)
-    return None, {
+_model_executor = None
+_model_executor_lock = threading.Lock()
+
+
+def inference_imgsz():
+    # the size decode_image resizes to (0 there = no resize, YOLO's default 640 here)
+    return current_app.config.get('INFERENCE_IMGSZ', 640) or 640
+
+
+def model_predict(model, source, imgsz):
+    # The one predict call, also used by `flask models parity/bench` so they measure what is served.
+    # imgsz is passed in: batcher and executor threads have no app context.
+    return model.predict(source=source, save=False, conf=0.5, imgsz=imgsz, verbose=False)
+
+
+def _run_model(model_name, source, imgsz):
+    started = time.perf_counter()
+    try:
+        results = model_predict(model_manager.get(model_name), source, imgsz)
+    except Exception:
+        metrics.model_errors.inc(model=model_name)
+        raise
+    metrics.inference_seconds.observe(time.perf_counter() - started, model=model_name)
+    return results
+
+
+def _predict(model_name, source, imgsz):
+    # with INFERENCE_BATCHING the images are merged with concurrent requests into one predict call
+    if inference_batcher.enabled:
+        return inference_batcher.predict(model_name, source, lambda images: _run_model(model_name, images, imgsz))
+    return _run_model(model_name, source, imgsz)
+
+
+def _predict_parallel(source, imgsz): # run pothole and waste model at the same time on the same source
+    global _model_executor
+    if _model_executor is None:
+        with _model_executor_lock:
+            # concurrent first requests must not each create (and leak) an executor
+            if _model_executor is None:
+                _model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="yolo")
+    pothole_future = _model_executor.submit(_predict, "pothole", source, imgsz)
+    waste_future = _model_executor.submit(_predict, "waste", source, imgsz)
+    return {"pothole": pothole_future.result(), "waste": waste_future.result()}
+
+
+def _parallel_mode():
+    return current_app.config.get('DETECTION_MODE', 'sequential') == 'parallel'
+
+
+WASTE_CLASS_MAP = {0: 'Glass', 1: 'Metal', 2: 'Paper', 3: 'Plastic', 4: 'Residual'}
+
+
+def decode_image(data):
+    # Pre-processing in front of the models. Phone photos are 12-48 MP but the models only look at
+    # INFERENCE_IMGSZ pixels, so: let the JPEG decoder downscale while decoding (draft mode),
+    # apply the EXIF orientation and resize so the longest side is INFERENCE_IMGSZ.
+    # The full-size original is only kept on disk for archival. Returns BGR (what YOLO expects
+    # for arrays) or None if the bytes are not an image.
+    target = current_app.config.get('INFERENCE_IMGSZ', 640)
+    try:
+        image = PILImage.open(io.BytesIO(data))
+        if target:
+            image.draft('RGB', (target, target))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    except (UnidentifiedImageError, OSError, ValueError, PILImage.DecompressionBombError):
+        return None  # DecompressionBombError: more than twice PIL's MAX_IMAGE_PIXELS
+    if target and max(image.size) > target:
+        image.thumbnail((target, target), PILImage.BILINEAR)
+    return np.ascontiguousarray(np.asarray(image)[:, :, ::-1])
+
+
+def _save_bytes(data, path):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _pothole_data(result, original_filename, detected_filename):
+    class_name = result.names[int(result.boxes.cls[0].item())]
+    pothole_severity = class_name.split('_')[0]
+    return {
+        "image_name": original_filename,
+        "detected_image_name": detected_filename,
+        "pothole_severity": pothole_severity,
+        "waste_category": None,
+        "detection_status": f"{pothole_severity} pothole is detected.",
+        "department": "Road Department",
+        "boxes": box_rows(result)
+    }
+
+
+def _waste_data(result, original_filename, detected_filename):
+    category = WASTE_CLASS_MAP.get(int(result.boxes.cls[0].item()), "Unknown")
+    return {
+        "image_name": original_filename,
+        "detected_image_name": detected_filename,
+        "pothole_severity": None,
+        "waste_category": category,
+        "detection_status": f"{category} is detected",
+        "department": "Waste Management Department",
+        "boxes": box_rows(result)
+    }
+
+
+def _empty_data(status):
+    return {
         "image_name": None,
+        "detected_image_name": None,
         "pothole_severity": None,
         "waste_category": None,
-        "detection_status": "No detection",
+        "detection_status": status,
         "department": None
     }
-   
+
+
+# detection type (= model name) -> (config folder prefix, result_data builder)
+_MODEL_OUTPUTS = {
+    "pothole": ("POTHOLE", _pothole_data),
+    "waste": ("WASTE", _waste_data),
+}
+
+
+def _read_upload(image, name_prefix):
+    # Reads the upload stream once, nothing touches the disk here.
+    # The image is decoded later, and only if the result is not cached.
+    data = image.read()
+    image.stream.seek(0)
+    digest = image_hash(data)
+    original_filename, detected_filename = storage.image_file_names(image.filename, digest, name_prefix)
+    return {
+        "data": data,
+        "hash": digest,
+        "array": None,
+        "original_filename": original_filename,
+        "detected_filename": detected_filename,
+    }
+
+
+def _model_version():
+    # the input size is part of the version: results at another size may differ
+    versions = [model_manager.version(name) for name in DETECTION_PRIORITY]
+    return "-".join(versions + [str(current_app.config.get('INFERENCE_IMGSZ', 640))])
+
+
+def _usable_cached(cached):
+    # A cached positive result is only reused while its original image still exists and the
+    # annotated image either exists or can be rendered from the stored boxes
+    if cached is None:
+        return None
+    detection_type, result_data = cached
+    if detection_type is not None:
+        folder_prefix = _MODEL_OUTPUTS[detection_type][0]
+        original = os.path.join(current_app.config[f'{folder_prefix}_ORIGINAL_FOLDER'], *result_data["image_name"].split('/'))
+        detected = os.path.join(current_app.config[f'{folder_prefix}_DETECTED_FOLDER'], *result_data["detected_image_name"].split('/'))
+        if not os.path.exists(original) or not (os.path.exists(detected) or result_data.get("boxes")):
+            return None
+    return cached
+
+
+def _models_available():
+    if model_manager.available(*DETECTION_PRIORITY):
+        return True
+    for name, status in model_manager.status().items():
+        if status["error"]:
+            metrics.model_errors.inc(model=name)
+    return False
+
+
+def detect_image_type(image): #Detect pothole or waste and save images to the correct storage folders
+    if not _models_available():
+        return None, None
+
+    timestamp = int(time.time())
+    upload = _read_upload(image, f"{timestamp}")
+    return _detect_uploads([upload])[0]
+
+
+def detect_image_batch(images):
+    # Detect a list of uploads with one predict call per model.
+    # Returns a list of (detection_type, result_data) in the same order as images, or None if models are missing.
+    if not _models_available():
+        return None
+
+    timestamp = int(time.time())
+    chunk_size = max(1, current_app.config.get('BATCH_CHUNK_SIZE', 16))
+    outcomes = []
+    # one chunk of uploads (bytes and decoded arrays) in memory at a time
+    for start in range(0, len(images), chunk_size):
+        # index keeps flat-layout names unique when a batch has two files with the same name
+        uploads = [_read_upload(image, f"{timestamp}_{index}")
+                   for index, image in enumerate(images[start:start + chunk_size], start)]
+        outcomes.extend(_detect_uploads(uploads))
+    return outcomes
+
+
+def _detect_uploads(uploads):
+    # Runs the models on decoded uploads. The original image is written to disk only once,
+    # and only when something was detected; images without detections are never saved.
+    # The annotated image is rendered later from the stored boxes, when someone first asks for it.
+    use_cache = current_app.config.get('RESULT_CACHE_ENABLED', True)
+    model_version = _model_version() if use_cache else None
+
+    outcomes = [None] * len(uploads)
+    pending = []
+    if use_cache:
+        # one query for the whole batch
+        with metrics.stage("cache_lookup"):
+            cached_results = result_cache.get_many([upload["hash"] for upload in uploads], model_version)
+    for index, upload in enumerate(uploads):
+        if use_cache:
+            cached = _usable_cached(cached_results.get(upload["hash"]))
+            metrics.cache_lookups.inc(result="miss" if cached is None else "hit")
+            if cached is not None:
+                outcomes[index] = cached
+                metrics.detections.inc(type=cached[0] or "none")
+                continue
+        with metrics.stage("decode"):
+            upload["array"] = decode_image(upload["data"])
+        if upload["array"] is None:
+            outcomes[index] = (None, _empty_data("Invalid image"))
+            metrics.detections.inc(type="invalid")
+        else:
+            pending.append(index)
+
+    if not pending:
+        return outcomes
+    inferred = list(pending)
+    imgsz = inference_imgsz()
+
+    parallel_results = {}
+    if _parallel_mode():
+        # both models see the whole batch at once, outputs are merged by DETECTION_PRIORITY
+        with metrics.stage("inference_parallel"):
+            batch_results = _predict_parallel([uploads[i]["array"] for i in pending], imgsz)
+        parallel_results = {name: dict(zip(pending, results)) for name, results in batch_results.items()}
+
+    for detection_type in DETECTION_PRIORITY:
+        if not pending:
+            break
+        folder_prefix, to_data = _MODEL_OUTPUTS[detection_type]
+        if parallel_results:
+            results = [parallel_results[detection_type][i] for i in pending]
+        else:
+            # sequential: each model only runs on the images the previous one found nothing in
+            with metrics.stage(f"inference_{detection_type}"):
+                results = _predict(detection_type, [uploads[i]["array"] for i in pending], imgsz)
+
+        still_pending = []
+        for index, result in zip(pending, results):
+            upload = uploads[index]
+            if len(result.boxes) > 0:
+                with metrics.stage("save_original"):
+                    _save_bytes(upload["data"], storage.folder_path(current_app.config[f'{folder_prefix}_ORIGINAL_FOLDER'], upload["original_filename"]))
+                if current_app.config.get('RENDER_ANNOTATIONS_EAGERLY'):
+                    with metrics.stage("write_annotated"):
+                        result.save(filename=storage.folder_path(current_app.config[f'{folder_prefix}_DETECTED_FOLDER'], upload["detected_filename"]))
+                outcomes[index] = (detection_type, to_data(result, upload["original_filename"], upload["detected_filename"]))
+                metrics.detections.inc(type=detection_type)
+            else:
+                still_pending.append(index)
+        pending = still_pending
+
+    for index in pending:
+        outcomes[index] = (None, _empty_data("No detection"))
+        metrics.detections.inc(type="none")
+
+    if use_cache:
+        with metrics.stage("cache_store"):
+            result_cache.put_many([(uploads[i]["hash"], *outcomes[i]) for i in inferred], model_version)
+
+    return outcomes
@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+from sqlalchemy import or_, select
+from database import db
+from api.models.detection_model import Detection
+from api.service.storage import absolute_path
+
+
+class FileCleanupQueue:
+    # Deletes stored image files of deleted detections in the background, in batches,
+    # so deleting thousands of rows does not wait for thousands of os.remove calls.
+
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 200
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"removed": 0, "missing": 0, "still_referenced": 0, "errors": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('FILE_CLEANUP_BATCH_SIZE', 200)
+        app.extensions['file_cleanup'] = self
+
+    def enqueue(self, relative_paths):
+        # Call after the delete is committed. Paths are relative (as stored on Detection)
+        for path in relative_paths:
+            if path:
+                self._queue.put(path)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="file-cleanup", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self, timeout=None):
+        batch = [self._queue.get(timeout=timeout)]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with self.app.app_context():
+                    self._remove(batch)
+            except Exception:
+                self.app.logger.exception("File cleanup batch failed")
+                self._count("errors", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def drain(self):
+        # Processes everything queued right now on the calling thread (CLI / tests)
+        while True:
+            try:
+                batch = self._next_batch(timeout=0)
+            except queue.Empty:
+                return
+            try:
+                self._remove(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _remove(self, batch):
+        # Files can be shared by several detections (re-uploads reuse cached results),
+        # so a file is only removed when no remaining detection points at it
+        paths = set(batch)
+        referenced = set()
+        for image_path, detected_image_path in db.session.execute(
+            select(Detection.image_path, Detection.detected_image_path).where(
+                or_(Detection.image_path.in_(paths), Detection.detected_image_path.in_(paths))
+            )
+        ):
+            referenced.update((image_path, detected_image_path))
+
+        for path in paths:
+            if path in referenced:
+                self._count("still_referenced")
+                continue
+            try:
+                os.remove(absolute_path(path))
+                self._count("removed")
+            except FileNotFoundError:
+                self._count("missing")
+            except OSError:
+                self.app.logger.exception("Could not remove %s", path)
+                self._count("errors")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "queued": self._queue.qsize()}
+
+
+file_cleanup = FileCleanupQueue()
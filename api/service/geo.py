@@ -0,0 +1,128 @@
+import math
+from sqlalchemy import and_, or_
+
+# Geohash helpers for the spatial queries. A geohash is a string where every extra
+# character narrows the cell, so all points inside a cell share the cell's prefix and
+# a plain B-tree index on the column can answer "everything in these cells" with range scans.
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells, precise enough for any query we run
+EARTH_RADIUS_M = 6371000
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash bits alternate longitude, latitude, longitude, ...
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def decode(geohash): # (latitude, longitude) of the centre of the cell
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (bits >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def cell_size(precision): # (height, width) in degrees of a cell at this precision
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = math.radians(lat2 - lat1)
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox_around(latitude, longitude, radius_m):
+    # (min_lat, min_lon, max_lat, max_lon) of a box that contains the circle
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lon = math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat))
+    return (max(latitude - d_lat, -90.0), max(longitude - d_lon, -180.0),
+            min(latitude + d_lat, 90.0), min(longitude + d_lon, 180.0))
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells=32):
+    # Geohash cells that together cover the box: the finest precision that needs at most
+    # max_cells cells, so the query becomes a handful of index range scans
+    if not all(math.isfinite(value) for value in (min_lat, min_lon, max_lat, max_lon)):
+        raise ValueError('coordinates must be finite')
+    # clamped to the world, a huge box would otherwise loop over an endless index range
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        lat_start = math.floor((min_lat + 90) / height)
+        lat_end = math.floor((max_lat + 90) / height)
+        lon_start = math.floor((min_lon + 180) / width)
+        lon_end = math.floor((max_lon + 180) / width)
+        if (lat_end - lat_start + 1) * (lon_end - lon_start + 1) > max_cells and precision > 1:
+            continue
+        cells = set()
+        for i in range(lat_start, lat_end + 1):
+            for j in range(lon_start, lon_end + 1):
+                center_lat = min(-90 + (i + 0.5) * height, 90.0)
+                center_lon = min(-180 + (j + 0.5) * width, 180.0)
+                cells.add(encode(center_lat, center_lon, precision))
+        return sorted(cells)
+    return []
+
+
+def _next_prefix(prefix):
+    # smallest geohash prefix sorting after every hash that starts with prefix (None = no upper bound)
+    stripped = prefix.rstrip(_BASE32[-1])
+    if not stripped:
+        return None
+    return stripped[:-1] + _BASE32[_BASE32.index(stripped[-1]) + 1]
+
+
+def cells_filter(column, cells):
+    # WHERE clause matching every geohash that starts with one of the cells (B-tree range scans)
+    conditions = []
+    for cell in cells:
+        upper = _next_prefix(cell)
+        conditions.append(column >= cell if upper is None else and_(column >= cell, column < upper))
+    return or_(*conditions)
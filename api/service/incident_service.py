@@ -0,0 +1,207 @@
+import math
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import bindparam, delete, select, update
+from database import db
+from api.models.detection_model import Detection
+from api.models.incident import Incident
+from api.service import geo
+
+# pothole severities from least to most severe, an incident keeps the worst one reported
+SEVERITY_ORDER = ["minor", "medium", "major"]
+
+
+def _worse_severity(current, new):
+    if current not in SEVERITY_ORDER:
+        return new
+    if new not in SEVERITY_ORDER:
+        return current
+    return max(current, new, key=SEVERITY_ORDER.index)
+
+
+def find_matching_incident(detection):
+    # Nearest incident of the same type within INCIDENT_RADIUS_M that was reported in the last
+    # INCIDENT_WINDOW_DAYS. Only incidents in the geohash cells around the point are loaded.
+    radius = current_app.config.get('INCIDENT_RADIUS_M', 25)
+    window = timedelta(days=current_app.config.get('INCIDENT_WINDOW_DAYS', 7))
+
+    cells = geo.covering_cells(*geo.bbox_around(detection.latitude, detection.longitude, radius))
+    candidates = Incident.query.filter(
+        Incident.detection_type == detection.detection_type,
+        Incident.last_reported_at >= detection.timestamp - window,
+        geo.cells_filter(Incident.geohash, cells)
+    ).all()
+
+    best, best_distance = None, None
+    for incident in candidates:
+        distance = geo.haversine_m(detection.latitude, detection.longitude, incident.latitude, incident.longitude)
+        if distance <= radius and (best is None or distance < best_distance):
+            best, best_distance = incident, distance
+    return best
+
+
+def attach_to_incident(detection):
+    # Links a new (not yet committed) detection to its incident, creating the incident if nothing matches
+    incident = find_matching_incident(detection)
+    if incident is None:
+        incident = Incident(
+            detection_type=detection.detection_type,
+            latitude=detection.latitude,
+            longitude=detection.longitude,
+            geohash=geo.encode(detection.latitude, detection.longitude),
+            report_count=1,
+            pothole_severity=detection.pothole_severity,
+            waste_category=detection.waste_category,
+            department=detection.department,
+            first_reported_at=detection.timestamp,
+            last_reported_at=detection.timestamp
+        )
+        db.session.add(incident)
+    else:
+        # Re-read the row locked (SELECT ... FOR UPDATE) so concurrent reports of the same incident
+        # update it one after the other instead of overwriting each other's count and mean
+        db.session.refresh(incident, with_for_update=True)
+        # keep the incident position at the mean of its reports
+        count = incident.report_count
+        incident.latitude = (incident.latitude * count + detection.latitude) / (count + 1)
+        incident.longitude = (incident.longitude * count + detection.longitude) / (count + 1)
+        incident.geohash = geo.encode(incident.latitude, incident.longitude)
+        incident.report_count = count + 1
+        incident.pothole_severity = _worse_severity(incident.pothole_severity, detection.pothole_severity)
+        incident.waste_category = detection.waste_category or incident.waste_category
+        incident.last_reported_at = max(incident.last_reported_at, detection.timestamp)
+
+    detection.incident = incident
+    return incident
+
+
+def detach_from_incident(detection):
+    # Called before a detection is deleted: unlinks it and recomputes what is left of its incident
+    incident_id = detection.incident_id
+    if incident_id is None:
+        return
+    detection.incident = None
+    db.session.flush()
+    recompute_incidents({incident_id})
+
+
+class _Reports:
+    # Running summary of the detections of one incident, fed in timestamp order
+    def __init__(self):
+        self.count = 0
+        self.latitude_sum = 0.0
+        self.longitude_sum = 0.0
+        self.severity = None
+        self.category = None
+        self.first = None
+        self.last = None
+
+    def add(self, row):
+        self.count += 1
+        self.latitude_sum += row.latitude
+        self.longitude_sum += row.longitude
+        self.severity = _worse_severity(self.severity, row.pothole_severity)
+        self.category = row.waste_category or self.category
+        self.first = self.first or row.timestamp
+        self.last = row.timestamp
+
+    def position(self): # mean of the reports
+        return self.latitude_sum / self.count, self.longitude_sum / self.count
+
+    def apply_to(self, incident):
+        incident.report_count = self.count
+        incident.latitude, incident.longitude = self.position()
+        incident.geohash = geo.encode(incident.latitude, incident.longitude)
+        incident.pothole_severity = self.severity
+        incident.waste_category = self.category
+        incident.first_reported_at = self.first
+        incident.last_reported_at = self.last
+
+
+def recompute_incidents(incident_ids):
+    # After detections were removed from incidents: count, position, severity, category and report
+    # times are recomputed from the detections still attached. Incidents left empty are deleted.
+    if not incident_ids:
+        return
+    incidents = Incident.query.filter(Incident.id.in_(incident_ids)).with_for_update().all()
+    reports = {}
+    for row in db.session.execute(
+        select(Detection.incident_id, Detection.latitude, Detection.longitude, Detection.timestamp,
+               Detection.pothole_severity, Detection.waste_category)
+        .where(Detection.incident_id.in_(incident_ids)).order_by(Detection.timestamp, Detection.id)
+    ):
+        reports.setdefault(row.incident_id, _Reports()).add(row)
+
+    for incident in incidents:
+        if incident.id in reports:
+            reports[incident.id].apply_to(incident)
+        else:
+            db.session.delete(incident)
+
+
+def _index_precision(radius):
+    # finest geohash precision whose cells are larger than the box around a radius circle
+    # (anywhere below 80 degrees latitude), so the box touches at most 4 cells
+    d_lat = 2 * radius / geo.EARTH_RADIUS_M * 180 / math.pi
+    for precision in range(geo.GEOHASH_PRECISION, 0, -1):
+        height, width = geo.cell_size(precision)
+        if height >= d_lat and width >= d_lat / math.cos(math.radians(80)):
+            return precision
+    return 1
+
+
+def rebuild_incidents(batch_size=5000):
+    # Regroups every detection into incidents, as if they had been reported one by one in timestamp
+    # order (backfill for detections from before incidents existed, or after changing the radius).
+    # Open incidents are kept in memory, indexed by geohash cell. Caller commits.
+    radius = current_app.config.get('INCIDENT_RADIUS_M', 25)
+    window = timedelta(days=current_app.config.get('INCIDENT_WINDOW_DAYS', 7))
+    precision = _index_precision(radius)
+
+    db.session.execute(update(Detection).values(incident_id=None), execution_options={"synchronize_session": False})
+    db.session.execute(delete(Incident), execution_options={"synchronize_session": False})
+
+    incidents = []  # (Incident, _Reports) of every group found so far
+    cells = {}      # (geohash cell of the incident's mean position, detection_type) -> indexes into incidents
+    assignments = []  # (detection id, index into incidents)
+    result = db.session.execute(
+        select(Detection.id, Detection.detection_type, Detection.department, Detection.latitude,
+               Detection.longitude, Detection.timestamp, Detection.pothole_severity, Detection.waste_category)
+        .order_by(Detection.timestamp, Detection.id).execution_options(yield_per=batch_size)
+    )
+    for row in result:
+        min_lat, min_lon, max_lat, max_lon = geo.bbox_around(row.latitude, row.longitude, radius)
+        nearby = {geo.encode(lat, lon, precision) for lat in (min_lat, max_lat) for lon in (min_lon, max_lon)}
+        best, best_distance = None, None
+        for cell in nearby:
+            indexes = cells.get((cell, row.detection_type), [])
+            for index in list(indexes):
+                group = incidents[index][1]
+                if group.last < row.timestamp - window:
+                    indexes.remove(index)  # closed for good, the timestamps only grow
+                    continue
+                distance = geo.haversine_m(row.latitude, row.longitude, *group.position())
+                if distance <= radius and (best is None or distance < best_distance):
+                    best, best_distance = index, distance
+
+        if best is None:
+            best = len(incidents)
+            incidents.append((Incident(detection_type=row.detection_type, department=row.department), _Reports()))
+        else:
+            cells[(geo.encode(*incidents[best][1].position(), precision), row.detection_type)].remove(best)
+        group = incidents[best][1]
+        group.add(row)
+        cells.setdefault((geo.encode(*group.position(), precision), row.detection_type), []).append(best)
+        assignments.append((row.id, best))
+
+    for incident, group in incidents:
+        group.apply_to(incident)
+    db.session.add_all(incident for incident, _ in incidents)
+    db.session.flush()
+
+    detections = Detection.__table__
+    link = detections.update().where(detections.c.id == bindparam('detection_id')).values(incident_id=bindparam('new_incident_id'))
+    for start in range(0, len(assignments), batch_size):
+        db.session.execute(link, [{"detection_id": detection_id, "new_incident_id": incidents[index][0].id}
+                                  for detection_id, index in assignments[start:start + batch_size]])
+    return len(incidents)
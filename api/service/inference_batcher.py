@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class _Request:
+    def __init__(self, images, run):
+        self.images = images
+        self.run = run
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    # Dynamic micro-batching in front of the models. Requests for the same model that arrive
+    # within window_ms of each other are merged (up to max_batch images) into one predict call,
+    # instead of every Flask thread running its own batch-1 forward pass.
+    # One worker thread per model, started on first use.
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.window = 0.005
+        self.max_batch = 16
+        self._queues = {}
+        self._workers = {}
+        self._carry = {}  # request that did not fit into the previous batch, per model
+        self._metrics = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INFERENCE_BATCHING', False)
+        self.window = app.config.get('INFERENCE_BATCH_WINDOW_MS', 5) / 1000
+        self.max_batch = max(1, app.config.get('INFERENCE_BATCH_MAX_SIZE', 16))
+        app.extensions['inference_batcher'] = self
+
+    def predict(self, model_name, images, run):
+        # Blocks until the batch containing images has run and returns their results in order.
+        # run(images) does the actual predict call; exceptions are raised in every waiting caller.
+        request = _Request(list(images), run)
+        self._queue(model_name).put(request)
+        return request.future.result()
+
+    def _queue(self, model_name):
+        requests = self._queues.get(model_name)
+        if requests is not None:
+            return requests
+        with self._lock:
+            if model_name not in self._queues:
+                self._metrics[model_name] = {
+                    "batches": 0,
+                    "requests": 0,
+                    "images": 0,
+                    "batch_sizes": {},
+                    "waits_ms": deque(maxlen=2048),
+                }
+                self._queues[model_name] = queue.Queue()
+                worker = threading.Thread(target=self._work, args=(model_name,),
+                                          name=f"batcher-{model_name}", daemon=True)
+                self._workers[model_name] = worker
+                worker.start()
+            return self._queues[model_name]
+
+    def _next_batch(self, model_name):
+        requests = self._queues[model_name]
+        first = self._carry.pop(model_name, None) or requests.get()
+        batch = [first]
+        size = len(first.images)
+        # wait at most window after the oldest request arrived for others to join
+        deadline = first.enqueued_at + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = requests.get(timeout=timeout) if timeout > 0 else requests.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request.images) > self.max_batch:
+                self._carry[model_name] = request  # goes first into the next batch
+                break
+            batch.append(request)
+            size += len(request.images)
+        return batch
+
+    def _work(self, model_name):
+        while True:
+            batch = self._next_batch(model_name)
+            started = time.perf_counter()
+            images = [image for request in batch for image in request.images]
+            self._record(model_name, batch, len(images), started)
+            try:
+                results = list(batch[0].run(images))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(results[offset:offset + len(request.images)])
+                offset += len(request.images)
+
+    def _record(self, model_name, batch, size, started):
+        with self._lock:
+            metrics = self._metrics[model_name]
+            metrics["batches"] += 1
+            metrics["requests"] += len(batch)
+            metrics["images"] += size
+            metrics["batch_sizes"][size] = metrics["batch_sizes"].get(size, 0) + 1
+            metrics["waits_ms"].extend((started - request.enqueued_at) * 1000 for request in batch)
+
+    def stats(self):
+        # batch size distribution and queue wait (time from arrival to the start of its batch) per model
+        with self._lock:
+            models = {}
+            for model_name, metrics in self._metrics.items():
+                waits = sorted(metrics["waits_ms"])
+                models[model_name] = {
+                    "batches": metrics["batches"],
+                    "requests": metrics["requests"],
+                    "images": metrics["images"],
+                    "mean_batch_size": round(metrics["images"] / metrics["batches"], 2) if metrics["batches"] else None,
+                    "batch_sizes": dict(sorted(metrics["batch_sizes"].items())),
+                    "queued": self._queues[model_name].qsize(),
+                    "queue_wait_ms": {
+                        "p50": round(waits[len(waits) // 2], 3),
+                        "p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 3),
+                        "max": round(waits[-1], 3),
+                    } if waits else None,
+                }
+            return {
+                "enabled": self.enabled,
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch,
+                "models": models,
+            }
+
+
+inference_batcher = InferenceBatcher()
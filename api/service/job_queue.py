@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DetectionJobQueue:
+    # In-process job queue: a thread pool runs the jobs and their state is kept in memory.
+    # It is the local stand-in for an external queue, so jobs are lost when the process restarts.
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.ttl = 3600
+        self.max_pending = 1000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.ttl = app.config.get('DETECTION_JOB_TTL', 3600)
+        self.max_pending = app.config.get('DETECTION_JOB_MAX_PENDING', 1000)
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config.get('DETECTION_JOB_WORKERS', 2),
+            thread_name_prefix="detection-job"
+        )
+        app.extensions['detection_jobs'] = self
+
+    def submit(self, owner_id, func, *args):
+        # Queues func(*args) and returns the job id, or None when too many jobs are waiting
+        self._prune()
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if pending >= self.max_pending:
+                return None
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'owner_id': owner_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+        self._executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status='running', started_at=time.time())
+        # every job gets its own app context so it has its own db session
+        with self.app.app_context():
+            try:
+                result = func(*args)
+            except Exception as e:
+                self.app.logger.exception("Detection job %s failed", job_id)
+                self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+                return
+        self._update(job_id, status='finished', result=result, finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _prune(self): # forget finished jobs older than the ttl
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] is not None and job['finished_at'] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+job_queue = DetectionJobQueue()
@@ -0,0 +1,178 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# In-process metrics in the Prometheus text format (GET /metrics), plus per-request stage
+# timings that end up in one structured log line per request. Counts are per worker process.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, values in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', '+Inf')])} {values[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {round(values[-2], 6)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {values[-1]}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.log_requests = False
+        self.logger = logging.getLogger('request_timing')
+        self._listening = False
+
+        self.requests = Counter("http_requests_total", "HTTP requests", ("method", "endpoint", "status"))
+        self.request_seconds = Histogram("http_request_duration_seconds", "HTTP request latency",
+                                         ("method", "endpoint"))
+        self.request_queries = Histogram("http_request_db_queries", "Database queries per HTTP request",
+                                         ("endpoint",), QUERY_BUCKETS)
+        self.stage_seconds = Histogram("detection_stage_seconds", "Time spent per upload processing stage", ("stage",))
+        self.inference_seconds = Histogram("model_inference_seconds", "Duration of one predict call", ("model",))
+        self.detections = Counter("detections_total", "Detection outcomes per image", ("type",))
+        self.cache_lookups = Counter("detection_cache_lookups_total", "Result cache lookups", ("result",))
+        self.model_errors = Counter("model_errors_total", "Failed model loads and predict calls", ("model",))
+        self.db_queries = Counter("db_queries_total", "SQL statements executed")
+        self._all = [self.requests, self.request_seconds, self.request_queries, self.stage_seconds,
+                     self.inference_seconds, self.detections, self.cache_lookups, self.model_errors, self.db_queries]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.log_requests = app.config.get('REQUEST_TIMING_LOG', False)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        if self.log_requests:
+            self.logger.setLevel(logging.INFO)
+            if not self.logger.handlers:
+                self.logger.addHandler(logging.StreamHandler())
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._count_query)
+            self._listening = True
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _timing(self): # the current request's timings, None outside requests
+        return g.get('request_timing') if has_app_context() else None
+
+    def _count_query(self, *args):
+        self.db_queries.inc()
+        timing = self._timing()
+        if timing is not None:
+            timing["db_queries"] += 1
+
+    def _start_request(self):
+        g.request_timing = {"started": time.perf_counter(), "stages": {}, "db_queries": 0}
+
+    def _finish_request(self, response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+        elapsed = time.perf_counter() - timing["started"]
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        self.requests.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        self.request_seconds.observe(elapsed, method=request.method, endpoint=endpoint)
+        self.request_queries.observe(timing["db_queries"], endpoint=endpoint)
+        if self.log_requests:
+            self.logger.info(json.dumps({
+                "method": request.method,
+                "endpoint": endpoint,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_queries": timing["db_queries"],
+                "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in timing["stages"].items()},
+            }))
+        return response
+
+    @contextmanager
+    def stage(self, name):
+        # Times a block as one processing stage (histogram + the request's timing log line)
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_seconds.observe(elapsed, stage=name)
+            timing = self._timing()
+            if timing is not None:
+                timing["stages"][name] = timing["stages"].get(name, 0.0) + elapsed
+
+    def render(self):
+        lines = []
+        for metric in self._all:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
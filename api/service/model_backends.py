@@ -0,0 +1,39 @@
+import os
+
+# Inference backends a model can run on. "pytorch" loads the .pt checkpoint, the others load an
+# artifact exported from it with `flask models export` (much faster on CPU-only hosts).
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+
+def artifact_path(weights_path, backend, int8=False):
+    # Where the exported artifact of weights_path lives (ultralytics' own naming)
+    stem = os.path.splitext(weights_path)[0]
+    if backend == 'pytorch':
+        return weights_path
+    if backend == 'onnx':
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    raise ValueError(f"Unknown model backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def export(weights_path, backend, int8=False, imgsz=640, data=None):
+    # Builds the artifact for backend from the .pt checkpoint and returns its path
+    from ultralytics import YOLO
+
+    model = YOLO(weights_path)
+    if backend == 'onnx':
+        # dynamic axes so batches of any size (batch endpoint, micro-batching) can be fed
+        path = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            # dynamic (weight-only) quantization needs no calibration data
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            target = artifact_path(weights_path, 'onnx', int8=True)
+            quantize_dynamic(path, target, weight_type=QuantType.QUInt8)
+            path = target
+        return path
+    if backend == 'openvino':
+        # INT8 uses post-training quantization, data is the calibration dataset yaml
+        options = {'data': data} if int8 and data else {}
+        return model.export(format='openvino', imgsz=imgsz, dynamic=True, int8=int8, **options)
+    raise ValueError(f"Nothing to export for backend {backend!r}")
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+
+def _load_yolo(path):
+    # ultralytics pulls in torch, so it is only imported when a model is actually needed.
+    # path can be a .pt checkpoint or an exported ONNX file / OpenVINO folder.
+    from ultralytics import YOLO
+    return YOLO(path, task='detect')
+
+
+class ModelManager:
+    # Loads models on first use instead of at import time and keeps track of
+    # load state and load times for the readiness probe.
+
+    def __init__(self):
+        self._specs = {}
+        self._models = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self.retry_seconds = 30
+        self.warm_up_imgsz = 640
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        # a model that failed to load is tried again after this many seconds (transient failures)
+        self.retry_seconds = app.config.get('MODEL_RETRY_SECONDS', 30)
+        # warm up at the size requests are served at (see detection_service.inference_imgsz)
+        self.warm_up_imgsz = app.config.get('INFERENCE_IMGSZ', 640) or 640
+        self.logger = app.logger  # also used from the warm-up thread, which has no app context
+        app.extensions['model_manager'] = self
+
+    def register(self, name, path, loader=_load_yolo):
+        with self._lock:
+            self._specs[name] = (path, loader)
+            self._models.pop(name, None)
+            self._status[name] = {
+                "path": path,
+                "loaded": False,
+                "load_seconds": None,
+                "error": None,
+                "failed_at": None,
+                "warmed_up": False,
+                "version": None,
+            }
+
+    def get(self, name): # returns the loaded model, or None if it failed to load
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # another thread may have loaded it while we waited for the lock
+            if name in self._models:
+                return self._models[name]
+            status = self._status[name]
+            if status["error"] and time.time() - status["failed_at"] < self.retry_seconds:
+                return None
+
+            path, loader = self._specs[name]
+            started = time.perf_counter()
+            try:
+                model = loader(path)
+            except Exception as e:
+                status["error"] = f"{type(e).__name__}: {e}"
+                status["failed_at"] = time.time()
+                self.logger.exception("Could not load model %s from %s", name, path)
+                return None
+            status["error"] = None
+            status["failed_at"] = None
+            status["loaded"] = True
+            status["load_seconds"] = round(time.perf_counter() - started, 3)
+            self._models[name] = model
+            return model
+
+    def available(self, *names): # loads the given models (all by default), True if every one is usable
+        return all(self.get(name) is not None for name in (names or self._specs))
+
+    def warm_up(self):
+        # Loads every model and runs one small inference so the first real request
+        # does not pay for lazy initialisation inside torch/ultralytics
+        dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+        for name in self._specs:
+            model = self.get(name)
+            if model is None:
+                continue
+            try:
+                model.predict(source=[dummy], save=False, imgsz=self.warm_up_imgsz, verbose=False)
+                self._status[name]["warmed_up"] = True
+            except Exception:
+                self.logger.exception("Warm-up failed for model %s", name)
+
+    def warm_up_async(self):
+        thread = threading.Thread(target=self.warm_up, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def version(self, name):
+        # Short hash of the weights file, so results cached for old weights are not reused.
+        # Does not load the model.
+        status = self._status[name]
+        if status["version"] is None:
+            path = self._specs[name][0]
+            digest = hashlib.sha256()
+            if os.path.isdir(path):
+                # exported models (e.g. OpenVINO) are folders: hash names and sizes of their files
+                for root, _, files in sorted(os.walk(path)):
+                    for filename in sorted(files):
+                        digest.update(f"{filename}:{os.path.getsize(os.path.join(root, filename))}".encode())
+            elif os.path.exists(path):
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            else:
+                digest.update(path.encode())
+            status["version"] = digest.hexdigest()[:12]
+        return status["version"]
+
+    def is_ready(self):
+        # Models not loaded yet still count as ready: they load on the first detection (or at start
+        # with MODEL_WARMUP). Only a model that failed to load makes the worker not ready.
+        return not any(status["error"] for status in self._status.values())
+
+    def status(self):
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+
+model_manager = ModelManager()
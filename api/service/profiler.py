@@ -0,0 +1,170 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+import jwt
+from flask import g, request
+from api.service.user_cache import user_cache
+
+PROFILE_HEADER = 'X-Profile'
+_PROFILE_ID = re.compile(r'^[0-9T]+-[0-9a-f]{8}$')
+
+
+class RequestProfiler:
+    # Opt-in cProfile (and optionally tracemalloc) around single requests, for finding out why a
+    # particular upload is slow. A request is profiled when an admin sends "X-Profile: 1" or when it
+    # is picked by PROFILING_SAMPLE_RATE. Reports go to PROFILE_FOLDER (<id>.prof / .txt / .json).
+    # With PROFILING_ENABLED off no request hooks are installed at all.
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.folder = None
+        self.sample_rate = 0.0
+        self.trace_memory = False
+        self.max_reports = 200
+        self.secret_key = None
+        # only one request is profiled at a time: profilers and tracemalloc are process-wide
+        self._active = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.folder = app.config['PROFILE_FOLDER']
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+        self.trace_memory = app.config.get('PROFILING_TRACEMALLOC', False)
+        self.max_reports = app.config.get('PROFILE_MAX_REPORTS', 200)
+        self.secret_key = app.config['SECRET_KEY']
+        app.extensions['profiler'] = self
+        if not self.enabled:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+
+    def _requested_by_admin(self):
+        # the header only counts with a valid admin token (the route itself checks the token again)
+        if request.headers.get(PROFILE_HEADER) != '1':
+            return False
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return False
+        try:
+            data = jwt.decode(auth_header.split(' ')[1], self.secret_key, algorithms=["HS256"])
+        except jwt.InvalidTokenError:
+            return False
+        user = user_cache.get_user(data.get("id"))
+        return user is not None and user.role == 'admin'
+
+    def _start(self):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not (sampled or self._requested_by_admin()):
+            return
+        if not self._active.acquire(blocking=False):
+            return  # another request is being profiled
+        g.profile = {
+            "profiler": cProfile.Profile(),
+            "started": time.perf_counter(),
+            "trigger": "sampled" if sampled else "header",
+            "tracemalloc": self.trace_memory and not tracemalloc.is_tracing(),
+        }
+        if g.profile["tracemalloc"]:
+            tracemalloc.start(25)
+        g.profile["profiler"].enable()
+
+    def _stop(self, profile):
+        profile["profiler"].disable()
+        snapshot = peak = None
+        if profile["tracemalloc"]:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self._active.release()
+        return snapshot, peak
+
+    def _finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        elapsed = time.perf_counter() - profile["started"]
+        snapshot, peak = self._stop(profile)
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._write(profile_id, profile, snapshot, peak, elapsed, response.status_code)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    def _teardown(self, exc):
+        # the request failed before after_request ran: just stop profiling
+        profile = g.pop('profile', None)
+        if profile is not None:
+            self._stop(profile)
+
+    def _write(self, profile_id, profile, snapshot, peak, elapsed, status):
+        base = os.path.join(self.folder, profile_id)
+        profile["profiler"].dump_stats(f"{base}.prof")
+
+        text = io.StringIO()
+        text.write(f"{request.method} {request.full_path} -> {status} in {elapsed * 1000:.1f} ms\n\n")
+        pstats.Stats(profile["profiler"], stream=text).sort_stats('cumulative').print_stats(60)
+        if snapshot is not None:
+            text.write(f"\nPeak traced memory: {peak / 1024:.1f} KiB\nTop allocations:\n")
+            for stat in snapshot.statistics('lineno')[:25]:
+                text.write(f"{stat}\n")
+        with open(f"{base}.txt", 'w') as f:
+            f.write(text.getvalue())
+
+        with open(f"{base}.json", 'w') as f:
+            json.dump({
+                "id": profile_id,
+                "created_at": datetime.utcnow().isoformat(),
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.url_rule.rule if request.url_rule else None,
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "trigger": profile["trigger"],
+                "peak_memory_bytes": peak,
+            }, f)
+        self._prune()
+
+    def _prune(self): # keep the newest max_reports reports
+        reports = self.list_reports()
+        for report in reports[self.max_reports:]:
+            for extension in ('.prof', '.txt', '.json'):
+                try:
+                    os.remove(os.path.join(self.folder, report["id"] + extension))
+                except FileNotFoundError:
+                    pass
+
+    def list_reports(self): # newest first
+        reports = []
+        if not self.folder or not os.path.isdir(self.folder):
+            return reports
+        for filename in os.listdir(self.folder):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, filename)) as f:
+                    reports.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        reports.sort(key=lambda report: report["id"], reverse=True)
+        return reports
+
+    def report_path(self, profile_id, extension): # None for unknown or malformed ids
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.folder, profile_id + extension)
+        return path if os.path.isfile(path) else None
+
+
+profiler = RequestProfiler()
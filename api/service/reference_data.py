@@ -0,0 +1,55 @@
+import threading
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database import db, dialect_insert
+from api.models.department import Department
+from api.models.tag import Tag
+
+# Departments and tags never change once created, so their ids are cached per process
+_department_ids = {}
+_tag_ids = {}
+_lock = threading.Lock()
+
+
+def _get_or_create_id(model, cache, name, **values):
+    with _lock:
+        if name in cache:
+            return cache[name]
+    # looked up earlier in this transaction (a batch with the same tag twice), not committed yet
+    pending = db.session.info.setdefault('reference_ids', [])
+    for pending_cache, pending_name, row_id in pending:
+        if pending_cache is cache and pending_name == name:
+            return row_id
+
+    # ON CONFLICT DO NOTHING makes concurrent first uploads safe (no find-or-create race).
+    # It runs in the request's transaction, so the id is only cached once that commits.
+    # no_autoflush: the caller's new detection must not be flushed here, its relationship
+    # appends would then lazy load the (empty) collections.
+    with db.session.no_autoflush:
+        db.session.execute(
+            dialect_insert(model.__table__).values(name=name, **values).on_conflict_do_nothing(index_elements=['name'])
+        )
+        row_id = db.session.execute(select(model.id).where(model.name == name)).scalar_one()
+    pending.append((cache, name, row_id))
+    return row_id
+
+
+@event.listens_for(Session, 'after_commit')
+def _cache_committed_ids(session):
+    pending = session.info.pop('reference_ids', [])
+    with _lock:
+        for cache, name, row_id in pending:
+            cache[name] = row_id
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_uncommitted_ids(session):
+    session.info.pop('reference_ids', None)
+
+
+def department_id(name):
+    return _get_or_create_id(Department, _department_ids, name)
+
+
+def tag_id(name, tag_type):
+    return _get_or_create_id(Tag, _tag_ids, name, type=tag_type)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import select
+from database import db, dialect_insert
+from api.models.detection_cache import DetectionCache
+
+
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    # Detection results keyed by (sha256 of the image bytes, model version).
+    # An in-process LRU sits in front of the detection_cache table so repeated
+    # uploads of the same photo skip inference entirely.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('RESULT_CACHE_SIZE', 1024)
+        app.extensions['result_cache'] = self
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, image_hash, model_version):
+        # Returns (detection_type, result_data) or None on a miss
+        return self.get_many([image_hash], model_version).get(image_hash)
+
+    def get_many(self, image_hashes, model_version):
+        # Returns {image_hash: (detection_type, result_data)} for the hashes that are cached.
+        # Whatever is not in memory is looked up with one IN query.
+        found = {}
+        missing = []
+        with self._lock:
+            for hash_value in dict.fromkeys(image_hashes):
+                value = self._entries.get((hash_value, model_version))
+                if value is None:
+                    missing.append(hash_value)
+                    continue
+                self._entries.move_to_end((hash_value, model_version))
+                self.counters["memory_hits"] += 1
+                found[hash_value] = (value[0], dict(value[1]))
+
+        if missing:
+            rows = db.session.execute(select(DetectionCache).where(
+                DetectionCache.model_version == model_version,
+                DetectionCache.image_hash.in_(missing)
+            )).scalars()
+            for row in rows:
+                value = (row.detection_type, json.loads(row.result))
+                self._remember((row.image_hash, model_version), value)
+                found[row.image_hash] = (value[0], dict(value[1]))
+            with self._lock:
+                db_hits = sum(1 for hash_value in missing if hash_value in found)
+                self.counters["db_hits"] += db_hits
+                self.counters["misses"] += len(missing) - db_hits
+        return found
+
+    def put_many(self, entries, model_version):
+        # entries: list of (image_hash, detection_type, result_data). The rows join the caller's
+        # transaction and are written by its commit. An existing row is replaced: it can be a result
+        # that was rejected because its image files are gone.
+        if not entries:
+            return
+        rows = {}
+        for hash_value, detection_type, result_data in entries:
+            self._remember((hash_value, model_version), (detection_type, dict(result_data)))
+            rows[hash_value] = ({
+                "image_hash": hash_value,
+                "model_version": model_version,
+                "detection_type": detection_type,
+                "result": json.dumps(result_data),
+                "created_at": datetime.utcnow(),
+            })
+        # one row per image: an upsert can't touch the same row twice (same photo twice in a batch)
+        insert = dialect_insert(DetectionCache.__table__).values(list(rows.values()))
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['image_hash', 'model_version'],
+            set_={
+                "detection_type": insert.excluded.detection_type,
+                "result": insert.excluded.result,
+                "created_at": insert.excluded.created_at,
+            }
+        ))
+        with self._lock:
+            self.counters["stores"] += len(entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["db_hits"]
+            return {
+                **self.counters,
+                "hit_ratio": round(hits / lookups, 3) if lookups else None,
+                "entries_in_memory": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,123 @@
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+from database import db, dialect_insert
+from api.models.detection_model import Detection
+from api.models.detection_stat import DetectionStat
+
+# Incrementally maintained counts behind GET /api/detections/stats. Every detection counts once
+# in its day row and once in its week row. The write paths call record_added / record_removed in
+# the same transaction as the detection itself; the changes are summed up in the session and
+# written with one upsert when it commits. `flask stats rebuild` recomputes everything.
+
+PERIODS = ("day", "week")
+_KEY_COLUMNS = ("period", "period_start", "detection_type", "department", "pothole_severity", "waste_category")
+
+# ?group_by= names -> columns
+DIMENSIONS = {
+    "type": DetectionStat.detection_type,
+    "department": DetectionStat.department,
+    "severity": DetectionStat.pothole_severity,
+    "category": DetectionStat.waste_category,
+}
+
+
+def period_start(timestamp, period): # the day, or the monday of its week
+    day = timestamp.date() if hasattr(timestamp, 'date') else timestamp
+    return day if period == 'day' else day - timedelta(days=day.weekday())
+
+
+def _keys(detection_type, department, pothole_severity, waste_category, timestamp):
+    for period in PERIODS:
+        yield (period, period_start(timestamp, period), detection_type, department,
+               pothole_severity or '', waste_category or '')
+
+
+def _apply(session, deltas):
+    # Adds the Counter of key -> delta to the table with one upsert, then drops rows that reached 0
+    rows = [dict(zip(_KEY_COLUMNS, key), count=delta) for key, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = DetectionStat.__table__
+    insert = dialect_insert(table).values(rows)
+    session.execute(insert.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={"count": table.c.count + insert.excluded.count}
+    ))
+    if any(row["count"] < 0 for row in rows):
+        session.execute(delete(DetectionStat).where(
+            DetectionStat.count <= 0,
+            DetectionStat.period_start.in_({row["period_start"] for row in rows})
+        ), execution_options={"synchronize_session": False})
+
+
+def _pending():
+    return db.session.info.setdefault('stat_deltas', Counter())
+
+
+def record_added(detection): # a new detection (not committed yet)
+    _pending().update(_keys(detection.detection_type, detection.department, detection.pothole_severity,
+                            detection.waste_category, detection.timestamp))
+
+
+def record_removed(rows):
+    # detections (or rows with their detection_type, department, pothole_severity, waste_category
+    # and timestamp) that are being deleted
+    deltas = _pending()
+    for row in rows:
+        for key in _keys(row.detection_type, row.department, row.pothole_severity, row.waste_category, row.timestamp):
+            deltas[key] -= 1
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending(session):
+    deltas = session.info.pop('stat_deltas', None)
+    if deltas:
+        _apply(session, deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop('stat_deltas', None)
+
+
+def rebuild(batch_size=5000):
+    # Recomputes the whole table from detections (backfills, or after manual edits).
+    # Detections are streamed, only the counts per key are kept in memory. Caller commits.
+    db.session.info.pop('stat_deltas', None)  # already counted by the rebuild
+    db.session.execute(delete(DetectionStat), execution_options={"synchronize_session": False})
+    counts = Counter()
+    columns = (Detection.detection_type, Detection.department, Detection.pothole_severity,
+               Detection.waste_category, Detection.timestamp)
+    result = db.session.execute(select(*columns).execution_options(yield_per=batch_size))
+    for row in result:
+        counts.update(_keys(*row))
+
+    rows = [dict(zip(_KEY_COLUMNS, key), count=count) for key, count in counts.items()]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(DetectionStat.__table__.insert(), rows[start:start + batch_size])
+    return len(rows)
+
+
+def query_stats(period, group_by, start=None, end=None, filters=None):
+    # Sums per period_start (and the group_by dimensions) between start and end (dates, inclusive).
+    # Reads only the rows of the requested buckets.
+    columns = [DetectionStat.period_start] + [DIMENSIONS[name] for name in group_by]
+    query = select(*columns, func.sum(DetectionStat.count)).where(DetectionStat.period == period)
+    if start is not None:
+        query = query.where(DetectionStat.period_start >= period_start(start, period))
+    if end is not None:
+        query = query.where(DetectionStat.period_start <= end)
+    for name, value in (filters or {}).items():
+        query = query.where(DIMENSIONS[name] == value)
+    query = query.group_by(*columns).order_by(*columns)
+
+    results = []
+    for row in db.session.execute(query):
+        item = {"period_start": row[0].isoformat()}
+        for name, value in zip(group_by, row[1:-1]):
+            item[name] = value or None  # '' = not set
+        item["count"] = int(row[-1])
+        results.append(item)
+    return results
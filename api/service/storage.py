@@ -0,0 +1,35 @@
+import os
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+
+def absolute_path(relative_path):
+    # Detection rows store paths like "storage/pothole/original/<name>", relative to the app root.
+    # Files under storage/ live in STORAGE_FOLDER, which can be configured to be somewhere else.
+    if relative_path.startswith('storage/'):
+        return os.path.join(current_app.config['STORAGE_FOLDER'], *relative_path.split('/')[1:])
+    return os.path.join(current_app.root_path, *relative_path.split('/'))
+
+
+def sharded_name(digest, extension):
+    # "ab/cd/abcd...<sha256>.jpg": two levels of 256 folders keep every directory small
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def image_file_names(upload_filename, digest, prefix):
+    # (original name, detected name) inside the original/ and detected/ folders of a detection type.
+    # "sharded" (default) names files by the sha256 of the upload, so two different uploads can
+    # never overwrite each other. "flat" is the old "<timestamp>_<client filename>" layout.
+    if current_app.config.get('STORAGE_LAYOUT', 'sharded') == 'sharded':
+        extension = os.path.splitext(upload_filename or '')[1].lower() or '.jpg'
+        return sharded_name(digest, extension), sharded_name(digest, '.jpg')
+
+    filename = secure_filename(upload_filename or '') or 'image.jpg'
+    return f"{prefix}_{filename}", f"{prefix}_detected_{filename}"
+
+
+def folder_path(folder, name):
+    # absolute path of name inside folder, creating the shard directories when needed
+    path = os.path.join(folder, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import tempfile
+import threading
+from PIL import Image as PILImage
+
+
+class ThumbnailCache:
+    # Resized copies of stored images, generated on first request and kept on disk.
+    # When the folder grows past max_bytes the least recently used files are removed.
+
+    def __init__(self, app=None):
+        self.folder = None
+        self.max_bytes = 256 * 1024 * 1024
+        self.widths = (64, 128, 256, 512, 1024)
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.config['THUMBNAIL_FOLDER']
+        self.max_bytes = app.config.get('THUMBNAIL_CACHE_MAX_BYTES', self.max_bytes)
+        self.widths = tuple(sorted(app.config.get('THUMBNAIL_WIDTHS', self.widths)))
+        os.makedirs(self.folder, exist_ok=True)
+        app.extensions['thumbnails'] = self
+
+    def snap_width(self, width):
+        # Only a few sizes are generated so the cache can't be filled with every possible width
+        for allowed in self.widths:
+            if width <= allowed:
+                return allowed
+        return self.widths[-1]
+
+    def key(self, source_path, width):
+        # Changes whenever the source file changes, so it doubles as a strong ETag
+        stat = os.stat(source_path)
+        raw = f"{source_path}:{stat.st_mtime_ns}:{stat.st_size}:{width}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def get(self, source_path, width):
+        # Returns (path of the resized image, etag); generates it when it is not cached yet
+        key = self.key(source_path, width)
+        path = os.path.join(self.folder, key[:2], f"{key}.jpg")
+        if os.path.exists(path):
+            os.utime(path)  # mark as recently used for the LRU eviction
+            return path, key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with PILImage.open(source_path) as image:
+            # draft lets the JPEG decoder skip most of the full-resolution decode
+            image.draft('RGB', (width, width))
+            image = image.convert('RGB')
+            image.thumbnail((width, 100000))  # fit the width, height follows the aspect ratio
+        # unique temp file in the same folder, renamed into place (the .tmp suffix keeps it out of the LRU)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                image.save(temp_file, 'JPEG', quality=80, optimize=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._add_bytes(os.path.getsize(path), keep=path)
+        return path, key
+
+    def _add_bytes(self, size, keep):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._folder_size()
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict(keep)
+
+    def _cached_files(self):
+        for root, _, files in os.walk(self.folder):
+            for filename in files:
+                if filename.endswith('.jpg'):
+                    path = os.path.join(root, filename)
+                    stat = os.stat(path)
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _folder_size(self):
+        return sum(size for _, size, _ in self._cached_files())
+
+    def _evict(self, keep):
+        # oldest first until we are back under 90% of the limit (never the file just generated)
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(self._cached_files()):
+            if self._total_bytes <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+
+thumbnails = ThumbnailCache()
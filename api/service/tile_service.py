@@ -0,0 +1,225 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+from database import db, dialect_insert
+from api.models.detection_model import Detection
+from api.models.detection_tile_cell import DetectionTileCell
+from api.service import geo
+
+# Map tiles (GET /api/detections/tiles/<z>/<x>/<y>): counts per grid cell instead of every point.
+# Every detection is counted in its geohash cell at each of TILE_PRECISIONS, so a tile at any zoom
+# reads a few dozen pre-aggregated rows. Cell changes are summed up in the session and written with
+# one upsert when it commits. Rendered tiles are cached in memory; a write drops the tiles
+# containing its point at every zoom once its transaction commits.
+
+TILE_PRECISIONS = range(1, 9)
+_KEY_COLUMNS = ("precision", "geohash", "detection_type", "label")
+CELLS_PER_TILE = 16  # aim for about this many cells across a tile
+
+
+def _label(row): # severity for potholes, category for waste
+    return row.pothole_severity or row.waste_category or ''
+
+
+def tile_bounds(z, x, y):
+    # (min_lat, min_lon, max_lat, max_lon) of a web mercator (slippy map) tile
+    n = 2 ** z
+    def lat(tile_y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_of(latitude, longitude, z): # (x, y) of the tile containing the point at zoom z
+    n = 2 ** z
+    latitude = max(min(latitude, 85.05112878), -85.05112878)
+    x = int((longitude + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitude)
+    y = int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def precision_for_zoom(z):
+    # finest stored precision whose cells are still at least 1/CELLS_PER_TILE of the tile width
+    tile_width = 360.0 / 2 ** z
+    best = TILE_PRECISIONS[0]
+    for precision in TILE_PRECISIONS:
+        if geo.cell_size(precision)[1] >= tile_width / CELLS_PER_TILE:
+            best = precision
+    return best
+
+
+def _collect(rows, sign):
+    # adds the rows to the cell deltas of the current transaction (written by _write_pending)
+    deltas = db.session.info.setdefault('tile_deltas', {})
+    points = db.session.info.setdefault('tile_points', [])
+    for row in rows:
+        geohash = geo.encode(row.latitude, row.longitude, TILE_PRECISIONS[-1])
+        for precision in TILE_PRECISIONS:
+            key = (precision, geohash[:precision], row.detection_type, _label(row))
+            count, lat_sum, lon_sum = deltas.get(key, (0, 0.0, 0.0))
+            deltas[key] = (count + sign, lat_sum + sign * row.latitude, lon_sum + sign * row.longitude)
+        points.append((row.latitude, row.longitude))
+
+
+def _apply(session, deltas):
+    # Adds the cell deltas to the table with one upsert, then drops cells that reached 0
+    values = [dict(zip(_KEY_COLUMNS, key), count=count, latitude_sum=lat_sum, longitude_sum=lon_sum)
+              for key, (count, lat_sum, lon_sum) in deltas.items() if count]
+    if not values:
+        return
+
+    table = DetectionTileCell.__table__
+    insert = dialect_insert(table).values(values)
+    session.execute(insert.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={
+            "count": table.c.count + insert.excluded.count,
+            "latitude_sum": table.c.latitude_sum + insert.excluded.latitude_sum,
+            "longitude_sum": table.c.longitude_sum + insert.excluded.longitude_sum,
+        }
+    ))
+    if any(value["count"] < 0 for value in values):
+        session.execute(delete(DetectionTileCell).where(
+            DetectionTileCell.count <= 0,
+            DetectionTileCell.geohash.in_({value["geohash"] for value in values})
+        ), execution_options={"synchronize_session": False})
+
+
+def record_added(detection): # a new detection (not committed yet)
+    _collect([detection], 1)
+
+
+def record_removed(rows):
+    # detections (or rows with detection_type, pothole_severity, waste_category, latitude, longitude)
+    # that are being deleted
+    _collect(rows, -1)
+
+
+def rebuild(batch_size=5000):
+    # Recomputes the whole table from detections, streaming them. Caller commits.
+    db.session.info.pop('tile_deltas', None)  # already counted by the rebuild
+    db.session.execute(delete(DetectionTileCell), execution_options={"synchronize_session": False})
+    columns = (Detection.detection_type, Detection.pothole_severity, Detection.waste_category,
+               Detection.latitude, Detection.longitude)
+    result = db.session.execute(select(*columns).execution_options(yield_per=batch_size))
+    cells = {}
+    for row in result:
+        geohash = geo.encode(row.latitude, row.longitude, TILE_PRECISIONS[-1])
+        for precision in TILE_PRECISIONS:
+            key = (precision, geohash[:precision], row.detection_type, _label(row))
+            count, lat_sum, lon_sum = cells.get(key, (0, 0.0, 0.0))
+            cells[key] = (count + 1, lat_sum + row.latitude, lon_sum + row.longitude)
+
+    values = [dict(zip(_KEY_COLUMNS, key), count=count, latitude_sum=lat_sum, longitude_sum=lon_sum)
+              for key, (count, lat_sum, lon_sum) in cells.items()]
+    for start in range(0, len(values), batch_size):
+        db.session.execute(DetectionTileCell.__table__.insert(), values[start:start + batch_size])
+    tile_cache.clear()
+    return len(values)
+
+
+def build_tile(z, x, y):
+    # Cells whose centre lies in the tile (so every cell belongs to exactly one tile per zoom)
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    precision = precision_for_zoom(z)
+    prefixes = {cell[:precision] for cell in geo.covering_cells(min_lat, min_lon, max_lat, max_lon)}
+    rows = db.session.execute(select(DetectionTileCell).where(
+        DetectionTileCell.precision == precision,
+        geo.cells_filter(DetectionTileCell.geohash, prefixes)
+    )).scalars()
+
+    cells = {}
+    for row in rows:
+        center_lat, center_lon = geo.decode(row.geohash)
+        if not (min_lat <= center_lat < max_lat and min_lon <= center_lon < max_lon):
+            continue
+        cell = cells.setdefault(row.geohash, {"geohash": row.geohash, "total": 0, "counts": {},
+                                              "_lat": 0.0, "_lon": 0.0})
+        cell["total"] += row.count
+        cell["_lat"] += row.latitude_sum
+        cell["_lon"] += row.longitude_sum
+        labels = cell["counts"].setdefault(row.detection_type, {})
+        labels[row.label or "unknown"] = labels.get(row.label or "unknown", 0) + row.count
+
+    for cell in cells.values():
+        # the centroid of the points in the cell, where the map draws the marker
+        cell["latitude"] = round(cell.pop("_lat") / cell["total"], 6)
+        cell["longitude"] = round(cell.pop("_lon") / cell["total"], 6)
+    return {"z": z, "x": x, "y": y, "precision": precision, "cells": sorted(cells.values(), key=lambda c: c["geohash"])}
+
+
+class TileCache:
+    # LRU of built tiles. Writes in this process drop the affected tiles on commit; the ttl bounds
+    # how long other worker processes can serve a tile that changed.
+
+    def __init__(self, max_entries=2048, ttl=60, max_zoom=18):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_zoom = max_zoom
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('TILE_CACHE_SIZE', 2048)
+        self.ttl = app.config.get('TILE_CACHE_TTL', 60)
+        self.max_zoom = app.config.get('TILE_MAX_ZOOM', 18)
+        app.extensions['tile_cache'] = self
+
+    def get(self, z, x, y):
+        key = (z, x, y)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            self.counters["misses"] += 1
+
+        tile = build_tile(z, x, y)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, tile)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return tile
+
+    def invalidate_points(self, points):
+        # drops every cached tile (at every zoom) that contains one of the points
+        keys = {(z, *tile_of(latitude, longitude, z)) for latitude, longitude in points
+                for z in range(self.max_zoom + 1)}
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tile_cache = TileCache()
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending(session):
+    deltas = session.info.pop('tile_deltas', None)
+    if deltas:
+        _apply(session, deltas)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_points(session):
+    points = session.info.pop('tile_points', None)
+    if points:
+        tile_cache.invalidate_points(points)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_uncommitted_points(session):
+    session.info.pop('tile_deltas', None)
+    session.info.pop('tile_points', None)
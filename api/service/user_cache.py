@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from database import db
+from api.models.user_model import User
+
+
+class UserCache:
+    # LRU of authenticated users keyed by id, entries expire after ttl seconds.
+    # Only column values are cached; every request gets its own session-bound User built
+    # from them with merge(load=False), which does not touch the database.
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('USER_CACHE_SIZE', 1024)
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        app.extensions['user_cache'] = self
+
+    def get_user(self, user_id):
+        # Returns the User for user_id (None if it does not exist), from the cache when possible
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.counters["hits"] += 1
+                values = entry[1]
+            else:
+                self.counters["misses"] += 1
+                values = None
+
+        if values is not None:
+            snapshot = User(**values)
+            make_transient_to_detached(snapshot)
+            return db.session.merge(snapshot, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None:
+            self._store(user, now)
+        return user
+
+    def _store(self, user, now):
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        with self._lock:
+            self._entries[user.id] = (now + self.ttl, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries), "ttl": self.ttl}
+
+
+user_cache = UserCache()
+
+
+# Any update or delete of a user through the ORM drops it from the cache of this process
+# (other processes see the change once their entry expires)
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
@@ -2,11 +2,30 @@ from flask import Flask
 from flask_cors import CORS
 from database import db, migrate
 from api.controller.detection_controller import detection_bp
+import json
 import os
 from config import Config
-from flask import send_from_directory
+from flask import send_from_directory, send_file, request, abort
+from werkzeug.security import safe_join
 from api.controller.auth.auth_controller import auth_bp
 from api.models.detection_model import Detection
+from api.service.job_queue import job_queue
+from api.service.model_manager import model_manager
+from api.service.detection_service import register_models
+from api.service.result_cache import result_cache
+from api.service.inference_batcher import inference_batcher
+from api.service.file_cleanup import file_cleanup
+from api.service.user_cache import user_cache
+from api.service.thumbnail_service import thumbnails
+from api.service.metrics import metrics
+from api.service.profiler import profiler
+from api.service.tile_service import tile_cache
+from api.controller.health_controller import health_bp
+from api.controller.metrics_controller import metrics_bp
+from api.controller.admin_controller import admin_bp
+from api.commands import register_commands
+from api.service.annotation_renderer import render
+from api.service.storage import absolute_path
 
 
 
@@ -21,9 +40,44 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # background workers for POST /api/detections/jobs
+    job_queue.init_app(app)
+    # in-process LRU in front of the detection_cache table
+    result_cache.init_app(app)
+    # removes image files of deleted detections in the background
+    file_cleanup.init_app(app)
+    # authenticated users, so token_required does not query the users table on every request
+    user_cache.init_app(app)
+    # resized copies of stored images for ?w=
+    thumbnails.init_app(app)
+    # merges model calls of concurrent requests into batches (INFERENCE_BATCHING)
+    inference_batcher.init_app(app)
+    # request / stage timings and counters for GET /metrics
+    metrics.init_app(app)
+    # opt-in cProfile of single requests (PROFILING_ENABLED), reports under /admin/profiles
+    profiler.init_app(app)
+    # built map tiles for /api/detections/tiles
+    tile_cache.init_app(app)
+
     # Register blueprint
     app.register_blueprint(detection_bp, url_prefix='/api/detections')
     app.register_blueprint(auth_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(admin_bp)
+    if app.config.get('METRICS_ENABLED'):
+        app.register_blueprint(metrics_bp)
+
+    # flask storage ... commands
+    register_commands(app)
+
+    # YOLO models on the configured backends (pytorch / onnx / openvino)
+    model_manager.init_app(app)
+    register_models(app)
+
+    # Models load lazily on the first detection. With MODEL_WARMUP they are loaded
+    # (and run once) in the background as soon as the worker starts instead.
+    if app.config.get('MODEL_WARMUP'):
+        model_manager.warm_up_async()
 
     #Adding a route to serve uploaded and storage files
     # To Serve uploaded images in local port
@@ -31,10 +85,37 @@ def create_app():
     def uploaded_file(filename):
         return send_from_directory(os.path.join(app.root_path, 'uploads'), filename)
     
+    # Detected images. ?w=256 returns a resized copy (generated once, then cached on disk).
+    # Responses carry an ETag and Cache-Control so browsers/proxies revalidate with 304s.
     @app.route('/storage/<detection_type>/<path:filename>')
     def storage_file(detection_type,filename):
-        detected_folder = os.path.join(app.root_path, 'storage', detection_type, 'detected')
-        return send_from_directory(detected_folder, filename)
+        if detection_type not in ('pothole', 'waste'):
+            abort(404)
+        detected_folder = app.config[f'{detection_type.upper()}_DETECTED_FOLDER']
+        max_age = app.config['STORAGE_CACHE_MAX_AGE']
+
+        source_path = safe_join(detected_folder, filename)
+        if source_path is None:
+            abort(404)
+        if not os.path.isfile(source_path):
+            # annotated images are rendered on first request from the boxes stored with the detection
+            detection = Detection.query.filter_by(
+                detected_image_path=f"storage/{detection_type}/detected/{filename}").first()
+            if detection is None or not detection.boxes:
+                abort(404)
+            original_path = absolute_path(detection.image_path)
+            if not os.path.isfile(original_path):
+                abort(404)
+            render(original_path, json.loads(detection.boxes), source_path)
+
+        width = request.args.get('w', type=int)
+        if not width:
+            return send_from_directory(detected_folder, filename, max_age=max_age)
+
+        path, etag = thumbnails.get(source_path, thumbnails.snap_width(width))
+        response = send_file(path, mimetype='image/jpeg', etag=etag, max_age=max_age, conditional=True)
+        response.cache_control.public = True
+        return response
 
     return app
 
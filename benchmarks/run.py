@@ -0,0 +1,249 @@
+"""End-to-end benchmark: boots create_app() against SQLite and replays a synthetic workload.
+
+    python -m benchmarks.run                          # stub models, JSON report on stdout
+    python -m benchmarks.run --models real --output results/today.json
+    python -m benchmarks.run --compare results/baseline.json
+
+Every endpoint is called through the Flask test client (no network), so the numbers cover
+routing, auth, detection, database and storage but not the WSGI server.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', choices=('stub', 'real'), default='stub',
+                        help='deterministic stub models or the configured YOLO weights')
+    parser.add_argument('--stub-call-ms', type=float, default=20.0, help='stub latency per predict call')
+    parser.add_argument('--stub-image-ms', type=float, default=5.0, help='stub latency per image in a call')
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--uploads', type=int, default=200, help='uploads in total, spread over the users')
+    parser.add_argument('--list-every', type=int, default=5, help='each user lists its detections after this many uploads')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--image-size', default='1280x960', help='WIDTHxHEIGHT of the synthetic JPEGs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database-url', default=None, help='default: a fresh SQLite file in a temp folder')
+    parser.add_argument('--output', default=None, help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', default=None, help='earlier JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='exit 1 if any endpoint p95 got slower by more than this fraction (e.g. 0.2)')
+    return parser.parse_args(argv)
+
+
+def _synthetic_jpegs(count, size, seed):
+    # Deterministic noisy gradients, different for every upload so the result cache never hits
+    import numpy as np
+    from PIL import Image as PILImage
+
+    width, height = size
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    images = []
+    for _ in range(count):
+        base = rng.integers(0, 256, 3).astype(np.float32)
+        noise = rng.normal(0, 25, (height, width, 3)).astype(np.float32)
+        pixels = np.clip(base * 0.5 + gradient * 0.5 + noise, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        PILImage.fromarray(pixels).save(buffer, 'JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(seconds, status)]
+        self._lock = threading.Lock()
+
+    def call(self, endpoint, send):
+        started = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((elapsed, response.status_code))
+        return response
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _summary(samples, wall_seconds):
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    errors = sum(1 for _, status in samples if status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        **{f"p{pct}_ms": round(_percentile(latencies, pct), 3) for pct in PERCENTILES},
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+def _run_parallel(concurrency, jobs):
+    # runs the callables on concurrency threads, returns the wall time
+    jobs = list(jobs)
+    lock = threading.Lock()
+    failures = []
+
+    def worker():
+        while True:
+            with lock:
+                if not jobs:
+                    return
+                job = jobs.pop(0)
+            try:
+                job()
+            except Exception as e:  # keep going, the report counts what completed
+                failures.append(e)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        print(f"{len(failures)} benchmark calls raised, first: {failures[0]!r}", file=sys.stderr)
+    return time.perf_counter() - started
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='pothole-bench-')
+    # config.py reads these at import time, so they are set before the app is imported
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}?timeout=30"
+    os.environ['STORAGE_FOLDER'] = os.path.join(workdir, 'storage')
+    sys.path.insert(0, REPO_DIR)
+
+    from app import create_app
+    from database import db
+    from api.service.model_manager import model_manager
+    from benchmarks import stub_models
+
+    app = create_app()
+    if args.models == 'stub':
+        stub_models.install(model_manager, args.stub_call_ms, args.stub_image_ms)
+    with app.app_context():
+        db.create_all()
+    if not model_manager.available():
+        raise SystemExit(f"Models are not available: {model_manager.status()}")
+
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+    images = _synthetic_jpegs(args.uploads, (width, height), args.seed)
+    recorder = Recorder()
+    users = [{"email": f"bench{i}@example.com", "password": f"bench-password-{i}"} for i in range(args.users)]
+    phases = {}
+
+    def register(user):
+        client = app.test_client()
+        recorder.call('POST /auth/register', lambda: client.post('/auth/register', json=user))
+
+    def login(user):
+        client = app.test_client()
+        response = recorder.call('POST /auth/login', lambda: client.post('/auth/login', json=user))
+        user["headers"] = {'Authorization': f"Bearer {response.get_json()['token']}"}
+        user["uploads"] = 0
+
+    def upload(user, index):
+        client = app.test_client()
+        data = {
+            'image': (io.BytesIO(images[index]), f"bench_{index}.jpg"),
+            'latitude': str(27.70 + (index % 50) * 0.0005),
+            'longitude': str(85.30 + (index // 50) * 0.0005),
+            'location': 'benchmark',
+        }
+        recorder.call('POST /api/detections/', lambda: client.post(
+            '/api/detections/', data=data, headers=user["headers"], content_type='multipart/form-data'))
+        user["uploads"] += 1
+        if args.list_every and user["uploads"] % args.list_every == 0:
+            recorder.call('GET /api/detections/my', lambda: client.get('/api/detections/my', headers=user["headers"]))
+            recorder.call('GET /api/detections/my/<type>',
+                          lambda: client.get('/api/detections/my/pothole', headers=user["headers"]))
+
+    phases["register"] = _run_parallel(args.concurrency, [lambda u=u: register(u) for u in users])
+    phases["login"] = _run_parallel(args.concurrency, [lambda u=u: login(u) for u in users])
+    phases["upload"] = _run_parallel(args.concurrency, [
+        lambda i=i: upload(users[i % len(users)], i) for i in range(args.uploads)])
+
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    phase_of = {'POST /auth/register': "register", 'POST /auth/login': "login"}
+    endpoints = {endpoint: _summary(samples, phases[phase_of.get(endpoint, "upload")])
+                 for endpoint, samples in sorted(recorder.samples.items())}
+    return {
+        "started_at": datetime.utcnow().isoformat() + 'Z',
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            **{key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'max_regression')},
+            "database": app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            **{key: app.config.get(key) for key in ('DETECTION_MODE', 'INFERENCE_BATCHING', 'INFERENCE_IMGSZ',
+                                                    'RESULT_CACHE_ENABLED', 'POTHOLE_MODEL_BACKEND', 'WASTE_MODEL_BACKEND')},
+        },
+        "phases_seconds": {name: round(seconds, 3) for name, seconds in phases.items()},
+        "endpoints": endpoints,
+    }
+
+
+def compare(report, baseline, max_regression):
+    # prints p95 / throughput changes per endpoint, returns False when a p95 regressed too much
+    ok = True
+    print(f"{'endpoint':32} {'p95 ms':>10} {'was':>10} {'change':>8} {'rps':>8} {'was':>8}", file=sys.stderr)
+    for endpoint, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if previous is None:
+            print(f"{endpoint:32} {current['p95_ms']:>10} {'-':>10}", file=sys.stderr)
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] if previous["p95_ms"] else 0.0
+        if max_regression is not None and change > max_regression:
+            ok = False
+        print(f"{endpoint:32} {current['p95_ms']:>10} {previous['p95_ms']:>10} {change:>+8.1%} "
+              f"{current['throughput_rps']:>8} {previous['throughput_rps']:>8}", file=sys.stderr)
+    return ok
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(report, json.load(f), args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,12 @@ from flask_migrate import Migrate
 
 db = SQLAlchemy()
 migrate = Migrate()
+
+
+def dialect_insert(table):
+    # INSERT that supports on_conflict_do_nothing / on_conflict_do_update on both databases we run on
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
@@ -0,0 +1,77 @@
+"""Add geohash to detections
+
+Revision ID: 3f8d6b0e2a17
+Revises: 7c2e9a41d5b3
+Create Date: 2026-10-18 11:02:47.518342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8d6b0e2a17'
+down_revision = '7c2e9a41d5b3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _geohash(latitude, longitude, precision=9):
+    # frozen copy of the encoder at this revision, so the backfill doesn't change with app code
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    even = True
+    for bit_count in range(1, precision * 5 + 1):
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            value_range[0] = mid
+        else:
+            bits = bits << 1
+            value_range[1] = mid
+        even = not even
+        if bit_count % 5 == 0:
+            chars.append(_BASE32[bits])
+            bits = 0
+    return "".join(chars)
+
+
+def upgrade():
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f('ix_detections_geohash'), ['geohash'], unique=False)
+
+    # Backfill existing rows, BATCH_SIZE at a time with one executemany per batch
+    connection = op.get_bind()
+    detections = sa.table('detections',
+        sa.column('id', sa.Integer),
+        sa.column('latitude', sa.Float),
+        sa.column('longitude', sa.Float),
+        sa.column('geohash', sa.String)
+    )
+    update = detections.update().where(detections.c.id == sa.bindparam('row_id')).values(geohash=sa.bindparam('row_geohash'))
+    last_id = None
+    while True:
+        query = sa.select(detections.c.id, detections.c.latitude, detections.c.longitude).order_by(detections.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(detections.c.id > last_id)
+        rows = connection.execute(query).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [
+            {"row_id": row.id, "row_geohash": _geohash(row.latitude, row.longitude)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_detections_geohash'))
+        batch_op.drop_column('geohash')
@@ -0,0 +1,35 @@
+"""Add detection_stats table (incrementally maintained dashboard counts)
+
+Fill it for existing detections with `flask stats rebuild`.
+
+Revision ID: 5b8e1c2d7f40
+Revises: e6b27d4f9c08
+Create Date: 2026-10-18 16:05:37.214908
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e1c2d7f40'
+down_revision = 'e6b27d4f9c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('detection_stats',
+    sa.Column('period', sa.String(length=5), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('detection_type', sa.String(length=20), nullable=False),
+    sa.Column('department', sa.String(length=100), nullable=False),
+    sa.Column('pothole_severity', sa.String(length=20), nullable=False),
+    sa.Column('waste_category', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'period_start', 'detection_type', 'department', 'pothole_severity', 'waste_category')
+    )
+
+
+def downgrade():
+    op.drop_table('detection_stats')
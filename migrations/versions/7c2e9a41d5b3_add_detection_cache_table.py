@@ -0,0 +1,31 @@
+"""Add detection_cache table
+
+Revision ID: 7c2e9a41d5b3
+Revises: 582a3844a16c
+Create Date: 2026-10-18 10:12:31.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a41d5b3'
+down_revision = '582a3844a16c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('detection_cache',
+    sa.Column('image_hash', sa.String(length=64), nullable=False),
+    sa.Column('model_version', sa.String(length=64), nullable=False),
+    sa.Column('detection_type', sa.String(length=20), nullable=True),
+    sa.Column('result', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('image_hash', 'model_version')
+    )
+
+
+def downgrade():
+    op.drop_table('detection_cache')
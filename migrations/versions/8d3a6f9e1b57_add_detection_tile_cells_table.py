@@ -0,0 +1,35 @@
+"""Add detection_tile_cells table (per-cell counts for the map tiles)
+
+Fill it for existing detections with `flask stats rebuild`.
+
+Revision ID: 8d3a6f9e1b57
+Revises: 5b8e1c2d7f40
+Create Date: 2026-10-18 17:22:48.530116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3a6f9e1b57'
+down_revision = '5b8e1c2d7f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('detection_tile_cells',
+    sa.Column('precision', sa.Integer(), nullable=False),
+    sa.Column('geohash', sa.String(length=12), nullable=False),
+    sa.Column('detection_type', sa.String(length=20), nullable=False),
+    sa.Column('label', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('latitude_sum', sa.Float(), nullable=False),
+    sa.Column('longitude_sum', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('precision', 'geohash', 'detection_type', 'label')
+    )
+
+
+def downgrade():
+    op.drop_table('detection_tile_cells')
@@ -0,0 +1,28 @@
+"""Add composite indexes for the detection listings
+
+Revision ID: 9a5f0c3d81e4
+Revises: c41a7e95b6d2
+Create Date: 2026-10-18 12:20:55.190462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a5f0c3d81e4'
+down_revision = 'c41a7e95b6d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_detections_user_type_timestamp', 'detections',
+                    ['user_id', 'detection_type', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_detections_user_timestamp', 'detections',
+                    ['user_id', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_detections_user_timestamp', table_name='detections')
+    op.drop_index('ix_detections_user_type_timestamp', table_name='detections')
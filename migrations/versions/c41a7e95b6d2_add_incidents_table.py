@@ -0,0 +1,54 @@
+"""Add incidents table and detections.incident_id
+
+Revision ID: c41a7e95b6d2
+Revises: 3f8d6b0e2a17
+Create Date: 2026-10-18 11:48:09.733520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41a7e95b6d2'
+down_revision = '3f8d6b0e2a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('incidents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('detection_type', sa.String(length=20), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('geohash', sa.String(length=12), nullable=True),
+    sa.Column('report_count', sa.Integer(), nullable=False),
+    sa.Column('pothole_severity', sa.String(length=20), nullable=True),
+    sa.Column('waste_category', sa.String(length=50), nullable=True),
+    sa.Column('department', sa.String(length=100), nullable=False),
+    sa.Column('first_reported_at', sa.DateTime(), nullable=True),
+    sa.Column('last_reported_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('incidents', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_incidents_geohash'), ['geohash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_incidents_last_reported_at'), ['last_reported_at'], unique=False)
+
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('incident_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_detections_incident_id'), ['incident_id'], unique=False)
+        batch_op.create_foreign_key('detections_incident_id_fkey', 'incidents', ['incident_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.drop_constraint('detections_incident_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_detections_incident_id'))
+        batch_op.drop_column('incident_id')
+
+    with op.batch_alter_table('incidents', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_incidents_last_reported_at'))
+        batch_op.drop_index(batch_op.f('ix_incidents_geohash'))
+
+    op.drop_table('incidents')
@@ -0,0 +1,28 @@
+"""Add boxes to detections for lazily rendered annotated images
+
+Revision ID: e6b27d4f9c08
+Revises: 9a5f0c3d81e4
+Create Date: 2026-10-18 13:41:16.882730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b27d4f9c08'
+down_revision = '9a5f0c3d81e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('boxes', sa.Text(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_detections_detected_image_path'), ['detected_image_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('detections', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_detections_detected_image_path'))
+        batch_op.drop_column('boxes')
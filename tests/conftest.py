@@ -0,0 +1,31 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def app():
+    # create_app() against SQLite in a temp folder, with the benchmark stub models instead of YOLO
+    workdir = tempfile.mkdtemp(prefix='pothole-test-')
+    # config.py reads these at import time, so they are set before the app is imported
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'test.db')}"
+    os.environ['STORAGE_FOLDER'] = os.path.join(workdir, 'storage')
+    sys.path.insert(0, REPO_DIR)
+
+    from app import create_app
+    from database import db
+    from api.service.model_manager import model_manager
+    from benchmarks import stub_models
+
+    app = create_app()
+    app.config['RESULT_CACHE_ENABLED'] = False
+    stub_models.install(model_manager)
+    with app.app_context():
+        db.create_all()
+    yield app
+    shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+from sqlalchemy import event
+
+# Listing endpoints must run the same number of statements whatever the page size (no N+1).
+# The app fixture (conftest.py) uses the benchmark stub models, so no torch or weights are needed.
+
+
+def _login(client, email):
+    client.post('/auth/register', json={"email": email, "password": "test-password"})
+    token = client.post('/auth/login', json={"email": email, "password": "test-password"}).json['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _upload_detections(client, headers, count, seed):
+    # The stubs find something in about 2 of 3 images, upload random ones until count were detected
+    rng = np.random.default_rng(seed)
+    created = 0
+    while created < count:
+        buffer = io.BytesIO()
+        PILImage.fromarray(rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(buffer, 'JPEG')
+        response = client.post('/api/detections/', headers=headers, content_type='multipart/form-data', data={
+            'image': (io.BytesIO(buffer.getvalue()), 'photo.jpg'),
+            'latitude': str(27.7 + created * 0.01), 'longitude': '85.3', 'location': 'Kathmandu',
+        })
+        assert response.status_code in (200, 201)
+        created += response.status_code == 201
+
+
+def _count_statements(app, send):
+    from database import db
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = send()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("path", ['/api/detections/my', '/api/detections/user'])
+def test_listing_statements_do_not_grow_with_rows(app, path):
+    client = app.test_client()
+    name = path.rsplit('/', 1)[-1]
+    one = _login(client, f"one-{name}@example.com")
+    many = _login(client, f"many-{name}@example.com")
+    _upload_detections(client, one, 1, seed=1)
+    _upload_detections(client, many, 12, seed=2)
+
+    # the first request of a user also loads the user, count the second one
+    for headers in (one, many):
+        client.get(path, headers=headers)
+    assert _count_statements(app, lambda: client.get(path, headers=one)) == \
+        _count_statements(app, lambda: client.get(path, headers=many))
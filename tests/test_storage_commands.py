@@ -0,0 +1,51 @@
+import os
+from datetime import datetime
+
+# `flask storage shard` on rows written before the sharded layout
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_shard_moves_baseline_rows(app):
+    from database import db
+    from api.models.detection_model import Detection
+    from api.models.user_model import User
+    from api.commands.storage_commands import _file_hash
+
+    original = os.path.join(app.config['POTHOLE_ORIGINAL_FOLDER'], '1700000000_road.jpg')
+    detected = os.path.join(app.config['POTHOLE_DETECTED_FOLDER'], '1700000000_detected_road.jpg')
+    _write(original, b'original image')
+    _write(detected, b'annotated image')
+
+    with app.app_context():
+        user = User(email='shard@example.com', password='x', role='user')
+        db.session.add(user)
+        db.session.flush()
+        # what the baseline stored: made-up paths, only image_name matches the file on disk
+        detection = Detection(
+            user_id=user.id, image_name='1700000000_road.jpg', image_path='uploads/pothole/road.jpg',
+            detected_image_path='storage/pothole/detected/road.jpg', detection_type='pothole',
+            latitude=27.7, longitude=85.3, location='Kathmandu', timestamp=datetime.utcnow(),
+            pothole_severity='minor', department='Road Department', detection_status='minor pothole is detected.'
+        )
+        db.session.add(detection)
+        db.session.commit()
+        detection_id = detection.id
+        digest = _file_hash(original)
+
+    result = app.test_cli_runner().invoke(args=['storage', 'shard'])
+    assert 'Moved 1 detections' in result.output, result.output
+
+    with app.app_context():
+        detection = db.session.get(Detection, detection_id)
+        new_name = f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        assert detection.image_name == new_name
+        assert detection.image_path == f"storage/pothole/original/{new_name}"
+        assert detection.detected_image_path == f"storage/pothole/detected/{new_name}"
+    assert os.path.isfile(os.path.join(app.config['POTHOLE_ORIGINAL_FOLDER'], *new_name.split('/')))
+    assert os.path.isfile(os.path.join(app.config['POTHOLE_DETECTED_FOLDER'], *new_name.split('/')))
+    assert not os.path.exists(original) and not os.path.exists(detected)